@@ -1,6 +1,153 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin.utils import unquote
+from django.contrib.auth.admin import UserAdmin
+from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connections
+from django.http import HttpResponseRedirect
+from django.template.response import TemplateResponse
+from django.urls import reverse
+from django.utils.functional import cached_property
 from .models import *
+from .purge import start_purge
 # Register your models here.
 
-admin.site.register(Expenses)
-admin.site.register(Category)
+
+class EstimatedCountPaginator(Paginator):
+    # Unfiltered changelists on PostgreSQL use the planner's row estimate
+    # (pg_class.reltuples) instead of a COUNT(*) over the whole table
+    estimate_threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            # reltuples is -1 before the first ANALYZE; small tables count exactly
+            if row and row[0] > self.estimate_threshold:
+                return row[0]
+        return super().count
+
+
+@admin.action(description='Delete selected in the background')
+def purge_in_background(modeladmin, request, queryset):
+    # Avoids the admin delete collector, which loads every related expense
+    modeladmin.delete_queryset(request, queryset)
+    modeladmin.message_user(request, f'Queued {len(queryset)} purge job(s).')
+
+
+class BackgroundPurgeMixin:
+    # Replaces the bulk delete action and the per-object delete page with the
+    # batched background purge
+    actions = [purge_in_background]
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def purge_target(self):
+        return 'user' if self.model is User else 'category'
+
+    def delete_model(self, request, obj):
+        start_purge(self.purge_target(), obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            start_purge(self.purge_target(), obj)
+
+    def delete_view(self, request, object_id, extra_context=None):
+        # The stock view lists every related object before deleting, which
+        # runs the collector over all of the owner's expenses
+        obj = self.get_object(request, unquote(object_id))
+        if obj is None:
+            return self._get_obj_does_not_exist_redirect(request, self.opts, object_id)
+        if not self.has_delete_permission(request, obj):
+            raise PermissionDenied
+
+        if request.method == 'POST':
+            self.delete_model(request, obj)
+            self.message_user(request, f'Queued the purge of “{obj}”.', messages.SUCCESS)
+            return HttpResponseRedirect(
+                reverse(f'admin:{self.opts.app_label}_{self.opts.model_name}_changelist', current_app=self.admin_site.name)
+            )
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Are you sure?',
+            'object': obj,
+            'opts': self.opts,
+            'app_label': self.opts.app_label,
+            **(extra_context or {}),
+        }
+        return TemplateResponse(request, 'admin/expenses_tracker/purge_confirmation.html', context)
+
+
+@admin.register(Expenses)
+class ExpensesAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'category', 'amount', 'date')
+    list_select_related = ('user', 'category')
+    list_filter = ('category',)
+    raw_id_fields = ('user',)
+    autocomplete_fields = ('category',)
+    date_hierarchy = 'date'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(Category)
+class CategoryAdmin(BackgroundPurgeMixin, admin.ModelAdmin):
+    list_display = ('name', 'is_active', 'created_at')
+    search_fields = ('name',)
+
+
+admin.site.unregister(User)
+
+
+@admin.register(User)
+class LargeUserAdmin(BackgroundPurgeMixin, UserAdmin):
+    # Boolean and group filters are unindexed scans on a large user table
+    list_filter = ()
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+admin.site.register(ReportJob)
+
+
+@admin.register(RecurringExpense)
+class RecurringExpenseAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'category', 'amount', 'frequency', 'next_date', 'is_active')
+    list_select_related = ('user', 'category')
+    raw_id_fields = ('user',)
+    autocomplete_fields = ('category',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(Budget)
+class BudgetAdmin(admin.ModelAdmin):
+    list_display = ('user', 'category', 'amount', 'spent', 'period_start', 'threshold_crossed_at')
+    list_select_related = ('user', 'category')
+    raw_id_fields = ('user',)
+    autocomplete_fields = ('category',)
+
+
+@admin.register(PurgeJob)
+class PurgeJobAdmin(admin.ModelAdmin):
+    list_display = ('target', 'object_id', 'status', 'deleted_count', 'total', 'updated_at')
+    list_filter = ('status', 'target')
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('method', 'path', 'status_code', 'duration_ms', 'query_count', 'user', 'created_at')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ExpensesTrackerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'expenses_tracker'
+
+    def ready(self):
+        # Register the category cache, sync log and budget signals
+        from . import budgets, category_cache, sync  # noqa: F401
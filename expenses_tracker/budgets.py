@@ -0,0 +1,129 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncMonth
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Budget, Expenses
+
+# Spend at which a budget's alert fires
+THRESHOLD_AMOUNT = ExpressionWrapper(
+    F('amount') * F('threshold') / 100,
+    output_field=DecimalField(max_digits=12, decimal_places=2)
+)
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month_start(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def apply_spend_deltas(user_id, deltas):
+    # Add each (category_id, month) -> amount delta to the matching budget with
+    # an atomic F() update; expenses outside a budget's current period are no-ops
+    touched = []
+    for (category_id, month), delta in deltas.items():
+        if not delta:
+            continue
+        updated = Budget.objects.filter(user=user_id, category=category_id, period_start=month).update(
+            spent=F('spent') + delta
+        )
+        if updated:
+            touched.append(category_id)
+
+    if touched:
+        check_thresholds(user_id, touched)
+
+
+def check_thresholds(user_id, category_ids):
+    # Flag budgets that have just crossed their threshold and clear the flag on
+    # those that dropped back below it; each row changes at most once
+    budgets = Budget.objects.filter(user=user_id, category__in=category_ids)
+    budgets.filter(threshold_crossed_at__isnull=True, spent__gte=THRESHOLD_AMOUNT).update(
+        threshold_crossed_at=timezone.now()
+    )
+    budgets.filter(threshold_crossed_at__isnull=False, spent__lt=THRESHOLD_AMOUNT).update(
+        threshold_crossed_at=None
+    )
+
+
+def grouped_spend(expenses, sign=1):
+    # (category_id, month) -> total of a queryset, one GROUP BY query
+    rows = expenses.order_by().annotate(month=TruncMonth('date')).values('category_id', 'month').annotate(
+        total=Sum('amount')
+    )
+    return {(row['category_id'], row['month']): sign * row['total'] for row in rows}
+
+
+def merge_deltas(*groups):
+    deltas = defaultdict(Decimal)
+    for group in groups:
+        for key, amount in group.items():
+            deltas[key] += amount
+    return deltas
+
+
+def refresh_budget(budget, today=None, reset_threshold=False):
+    # Recompute spend from scratch for the current month; used when a budget is
+    # created, changes category or rolls over into a new month. The time the
+    # threshold was crossed is kept unless the period or category changes
+    today = today or timezone.localdate()
+    with transaction.atomic():
+        budget = Budget.objects.select_for_update().get(pk=budget.pk)
+        period_start = month_start(today)
+        spent = Expenses.objects.filter(
+            user=budget.user_id,
+            category=budget.category_id,
+            date__gte=period_start,
+            date__lt=next_month_start(period_start)
+        ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+
+        if reset_threshold or budget.period_start != period_start:
+            budget.threshold_crossed_at = None
+        budget.period_start = period_start
+        budget.spent = spent
+        budget.save(update_fields=['period_start', 'spent', 'threshold_crossed_at', 'updated_at'])
+        check_thresholds(budget.user_id, [budget.category_id])
+    budget.refresh_from_db()
+    return budget
+
+
+def roll_over_budgets(user, today=None):
+    # Budgets still on an earlier month start the current one
+    period_start = month_start(today or timezone.localdate())
+    for budget in Budget.objects.filter(user=user, period_start__lt=period_start):
+        refresh_budget(budget, today)
+
+
+@receiver(post_save, sender=Expenses)
+def track_expense_saved(sender, instance, created, **kwargs):
+    deltas = defaultdict(Decimal)
+    if not created:
+        original = getattr(instance, '_loaded_spend', None)
+        if original is None:
+            # Loaded with deferred fields; the change is unknown, so rebuild
+            # from the rows of the budgets this expense can touch
+            for budget in Budget.objects.filter(user=instance.user_id):
+                refresh_budget(budget)
+            return
+        category_id, day, amount = original
+        deltas[(category_id, month_start(day))] -= Decimal(amount)
+
+    deltas[(instance.category_id, month_start(instance.date))] += Decimal(instance.amount)
+    apply_spend_deltas(instance.user_id, deltas)
+    instance._loaded_spend = (instance.category_id, instance.date, instance.amount)
+
+
+@receiver(post_delete, sender=Expenses)
+def track_expense_deleted(sender, instance, **kwargs):
+    apply_spend_deltas(instance.user_id, {
+        (instance.category_id, month_start(instance.date)): -Decimal(instance.amount)
+    })
@@ -0,0 +1,87 @@
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Category
+
+# Shared key holding the current category version; every worker compares its
+# local copy against it, at most once per CATEGORY_CACHE_CHECK_SECONDS, and
+# reloads the table when it changes
+VERSION_KEY = 'expenses_tracker:category_version'
+
+
+class CategoryCache:
+    # Per-process copy of the category table, keyed by id
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._rows = {}
+        # monotonic time until which the local copy is used without asking
+        # the shared cache for the version
+        self._checked_until = 0
+
+    def _current_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    def _load(self, force=False):
+        now = time.monotonic()
+        if not force and now < self._checked_until:
+            return self._rows
+
+        version = self._current_version()
+        self._checked_until = now + settings.CATEGORY_CACHE_CHECK_SECONDS
+        if version == self._version:
+            return self._rows
+
+        with self._lock:
+            if version != self._version:
+                rows = Category.objects.filter(is_active=True).order_by('id').values('id', 'name', 'description', 'created_at')
+                self._rows = {row['id']: row for row in rows}
+                self._version = version
+        return self._rows
+
+    def all(self):
+        return list(self._load().values())
+
+    def get(self, pk, recheck_missing=False):
+        row = self._load().get(pk)
+        if row is None and recheck_missing:
+            # May have been created by another worker since the last check
+            row = self._load(force=True).get(pk)
+        return row
+
+    def get_name(self, pk):
+        row = self.get(pk)
+        return row['name'] if row else None
+
+    def ids_matching(self, text):
+        # Ids of categories whose name contains `text`, case-insensitively
+        text = text.lower()
+        return [pk for pk, row in self._load().items() if text in row['name'].lower()]
+
+    def invalidate(self):
+        cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+        self._checked_until = 0
+
+
+category_cache = CategoryCache()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, **kwargs):
+    # Bump now for this transaction's own reads, and again after commit so no
+    # worker keeps a copy loaded before the change became visible
+    category_cache.invalidate()
+    transaction.on_commit(category_cache.invalidate)
@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from expenses_tracker.profiling import make_profile_token
+
+
+class Command(BaseCommand):
+    help = 'Print a signed X-Profile header value that enables request profiling'
+
+    def handle(self, *args, **options):
+        self.stdout.write(make_profile_token())
+        self.stderr.write(f'Valid for {settings.PROFILING_TOKEN_MAX_AGE} seconds')
@@ -0,0 +1,22 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from expenses_tracker.recurring import materialize_recurring_expenses
+
+
+class Command(BaseCommand):
+    help = 'Create the expenses of all recurring expenses that are due'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Materialize up to this date (YYYY-MM-DD), default today')
+        parser.add_argument('--batch-size', type=int, help='Override RECURRING_BATCH_SIZE')
+
+    def handle(self, *args, **options):
+        if options['date']:
+            today = datetime.strptime(options['date'], '%Y-%m-%d').date()
+        else:
+            today = timezone.localdate()
+        created = materialize_recurring_expenses(today, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Materialized {created} expenses'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from expenses_tracker.profiling import prune_request_profiles
+
+
+class Command(BaseCommand):
+    help = 'Delete request profiles and their files older than the retention window'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Override PROFILE_RETENTION_DAYS')
+
+    def handle(self, *args, **options):
+        deleted = prune_request_profiles(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} request profiles'))
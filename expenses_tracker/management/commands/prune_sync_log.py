@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from expenses_tracker.sync import prune_change_log
+
+
+class Command(BaseCommand):
+    help = 'Delete expense change log entries older than the sync retention window'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Override SYNC_LOG_RETENTION_DAYS')
+
+    def handle(self, *args, **options):
+        deleted = prune_change_log(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} change log entries'))
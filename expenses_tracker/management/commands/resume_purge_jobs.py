@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from expenses_tracker.models import PurgeJob
+from expenses_tracker.purge import run_purge_job
+
+
+class Command(BaseCommand):
+    help = 'Run purge jobs that are pending, failed, or whose worker stopped reporting progress'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Override PURGE_BATCH_SIZE')
+
+    def handle(self, *args, **options):
+        job_ids = PurgeJob.objects.filter(status__in=['pending', 'running', 'failed']).values_list('id', flat=True)
+        for job_id in list(job_ids):
+            job = run_purge_job(job_id, options['batch_size'])
+            self.stdout.write(f'{job}: {job.status}, {job.deleted_count} expenses deleted')
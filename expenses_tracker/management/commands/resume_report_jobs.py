@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from expenses_tracker.reports import run_report_job, stale_report_jobs
+
+
+class Command(BaseCommand):
+    help = 'Run report jobs abandoned by a worker restart'
+
+    def handle(self, *args, **options):
+        for job_id in list(stale_report_jobs().values_list('id', flat=True)):
+            job = run_report_job(job_id)
+            if job is not None:
+                self.stdout.write(f'{job}')
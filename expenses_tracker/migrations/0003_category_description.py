@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 23:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses_tracker', '0002_reportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='description',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -9,15 +9,55 @@ from django.core.validators import MinValueValidator
 class Category(models.Model) :
     # category name
     name = models.CharField(max_length=200, unique=True)
+    # category description
+    description = models.TextField(blank=True)
+    # cleared while the category and its expenses are being purged
+    is_active = models.BooleanField(default=True)
     # time created 
     created_at = models.DateTimeField(auto_now_add=True)
     # time updated
-    updated_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
     
 
+# template that the scheduler turns into an expense on every due date
+class RecurringExpense(models.Model):
+    FREQUENCY_CHOICES = [
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+        ('yearly', 'Yearly'),
+    ]
+
+    # user that owns the recurring expense
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recurring_expenses')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='recurring_expenses')
+    amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal("0.01"))])
+    description = models.TextField()
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES)
+    # first occurrence; monthly and yearly occurrences keep its day
+    start_date = models.DateField()
+    # last day an occurrence may fall on, if any
+    end_date = models.DateField(null=True, blank=True)
+    # next occurrence still to be materialized
+    next_date = models.DateField()
+    # cleared once end_date has passed
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['next_date']
+        indexes = [
+            # the scheduler scans active templates that are due
+            models.Index(fields=['is_active', 'next_date']),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.category} {self.amount} {self.frequency}"
+
+
 class Expenses (models.Model):
     # user that created the expenses
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='expenses')
@@ -32,13 +72,171 @@ class Expenses (models.Model):
     # date created or submitted
     created_at = models.DateTimeField(auto_now_add=True)
     # date updated or edited
-    updated_at =  models.DateTimeField(auto_now_add=True)
+    updated_at =  models.DateTimeField(auto_now=True)
+    # recurring expense this was materialized from, and for which occurrence
+    recurring = models.ForeignKey(RecurringExpense, on_delete=models.SET_NULL, null=True, blank=True, related_name='occurrences')
+    occurrence_date = models.DateField(null=True, blank=True)
 
     class Meta:
         ordering = ['-date', 'category']
+        indexes = [
+            # serves the default ordering and the admin date hierarchy
+            models.Index(fields=['-date', 'category']),
+        ]
+        constraints = [
+            # makes materializing an occurrence idempotent
+            models.UniqueConstraint(fields=['recurring', 'occurrence_date'], name='unique_recurring_occurrence'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # stored category, date and amount, so budget totals can be adjusted
+        # on save without re-reading the row
+        loaded = dict(zip(field_names, values))
+        if all(name in loaded for name in ('category_id', 'date', 'amount')):
+            instance._loaded_spend = (loaded['category_id'], loaded['date'], loaded['amount'])
+        return instance
 
     def __str__(self):
         return f"{self.user} {self.category} {self.amount}"
     
 
 
+# report generated in the background from a user's expenses
+class ReportJob(models.Model):
+    PERIOD_CHOICES = [
+        ('monthly', 'Monthly'),
+        ('yearly', 'Yearly'),
+    ]
+    FORMAT_CHOICES = [
+        ('pdf', 'PDF'),
+        ('csv', 'CSV'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    # user that requested the report
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='report_jobs')
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    format = models.CharField(max_length=3, choices=FORMAT_CHOICES)
+    # date range covered by the report
+    date_from = models.DateField()
+    date_to = models.DateField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    # snapshot of the expenses in range, used to reuse an earlier result
+    fingerprint = models.CharField(max_length=64, blank=True)
+    file = models.FileField(upload_to='reports/', blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # set when a worker claims the job; a stale value means the worker died
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'period', 'format', 'date_from', 'date_to', 'fingerprint']),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.period} {self.format} {self.status}"
+
+# append-only log of expense writes, read by the mobile delta sync endpoint
+class ExpenseChange(models.Model):
+    # owner of the changed expense
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='expense_changes')
+    # id of the changed expense; kept as a plain value so it outlives deletes
+    expense_id = models.BigIntegerField()
+    # whether the change was a delete (a tombstone)
+    deleted = models.BooleanField(default=False)
+    # time the change was recorded, used for retention
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.expense_id} {'deleted' if self.deleted else 'changed'}"
+
+# background deletion of a user or category and all of its expenses
+class PurgeJob(models.Model):
+    TARGET_CHOICES = [
+        ('user', 'User'),
+        ('category', 'Category'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    target = models.CharField(max_length=10, choices=TARGET_CHOICES)
+    # id of the user or category being deleted
+    object_id = models.BigIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    # expenses to delete when the job started, and deleted so far
+    total = models.BigIntegerField(null=True, blank=True)
+    deleted_count = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.target} {self.object_id} {self.status}"
+
+# monthly spending limit for one category, with the current month's spend
+# kept up to date on every expense write
+class Budget(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='budgets')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='budgets')
+    # monthly limit
+    amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal("0.01"))])
+    # percentage of the limit that triggers an alert
+    threshold = models.PositiveSmallIntegerField(default=80, validators=[MinValueValidator(1)])
+    # first day of the month `spent` covers
+    period_start = models.DateField()
+    # amount spent in the category during the period
+    spent = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    # set when spending crossed the threshold this period
+    threshold_crossed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category'], name='unique_user_category_budget'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.category} {self.spent}/{self.amount}"
+
+# cProfile and SQL capture of a single request, taken on demand
+class RequestProfile(models.Model):
+    # user the request was authenticated as, if any
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='request_profiles')
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2000)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    # JSON artifact with the SQL statements and the profile
+    file = models.FileField(upload_to='profiles/')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.method} {self.path} {self.duration_ms:.0f}ms"
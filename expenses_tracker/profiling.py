@@ -0,0 +1,151 @@
+import cProfile
+import io
+import json
+import logging
+import pstats
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .models import RequestProfile
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = 'profile'
+TRUTHY_VALUES = {'1', 'true', 'yes', 'on'}
+SIGNING_SALT = 'expenses_tracker.profiling'
+
+# Paths whose query parameters carry credentials or personal data (password
+# hashes, emails); their SQL is stored without parameters
+REDACTED_PATH_PREFIXES = ('/api/auth/', '/admin/')
+
+# Functions listed in the stored profile, by cumulative time
+PROFILE_LIMIT = 50
+
+
+def make_profile_token():
+    # Value for the X-Profile header; valid for PROFILING_TOKEN_MAX_AGE seconds
+    return signing.TimestampSigner(salt=SIGNING_SALT).sign('profile')
+
+
+def has_valid_token(request):
+    try:
+        signing.TimestampSigner(salt=SIGNING_SALT).unsign(
+            request.META[PROFILE_HEADER], max_age=settings.PROFILING_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def authenticated_user(request):
+    # Middleware runs before DRF authentication, so resolve the JWT here
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+class QueryRecorder:
+    # connection.execute_wrapper hook collecting every statement and its time
+    def __init__(self, redact_params=False):
+        self.queries = []
+        self.redact_params = redact_params
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': None if self.redact_params else repr(params),
+                'duration_ms': round((time.perf_counter() - start) * 1000, 3),
+            })
+
+
+class RequestProfilerMiddleware:
+    # Profiles a single request when it carries a signed X-Profile header or,
+    # for staff users, ?profile=1. Other requests only pay for the two lookups
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        flagged = request.GET.get(PROFILE_PARAM, '').lower() in TRUTHY_VALUES
+        if PROFILE_HEADER not in request.META and not flagged:
+            return self.get_response(request)
+
+        user = authenticated_user(request)
+        if PROFILE_HEADER in request.META:
+            enabled = has_valid_token(request)
+        else:
+            enabled = user is not None and user.is_staff
+        if not enabled:
+            return self.get_response(request)
+
+        return self.profile(request, user)
+
+    def profile(self, request, user):
+        recorder = QueryRecorder(redact_params=request.path.startswith(REDACTED_PATH_PREFIXES))
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration_ms = (time.perf_counter() - start) * 1000
+
+        stats_output = io.StringIO()
+        pstats.Stats(profiler, stream=stats_output).sort_stats('cumulative').print_stats(PROFILE_LIMIT)
+
+        artifact = {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status_code': response.status_code,
+            'duration_ms': round(duration_ms, 3),
+            'query_count': len(recorder.queries),
+            'query_time_ms': round(sum(query['duration_ms'] for query in recorder.queries), 3),
+            'queries': recorder.queries,
+            'profile': stats_output.getvalue(),
+        }
+        profile = RequestProfile(
+            user=user,
+            method=request.method,
+            path=request.get_full_path()[:2000],
+            status_code=response.status_code,
+            duration_ms=duration_ms,
+            query_count=len(recorder.queries)
+        )
+        # A failure to store the profile must not fail the profiled request
+        try:
+            profile.file.save('request.json', ContentFile(json.dumps(artifact, indent=2).encode()), save=False)
+            profile.save()
+        except Exception:
+            logger.exception('Could not store the profile of %s %s', request.method, request.path)
+            return response
+
+        response['X-Profile-Id'] = str(profile.pk)
+        return response
+
+
+def prune_request_profiles(days=None):
+    # Delete profiles past the retention window together with their files
+    days = settings.PROFILE_RETENTION_DAYS if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted = 0
+    for profile in RequestProfile.objects.filter(created_at__lt=cutoff).only('id', 'file').iterator():
+        profile.file.delete(save=False)
+        profile.delete()
+        deleted += 1
+    return deleted
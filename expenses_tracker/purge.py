@@ -0,0 +1,126 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .category_cache import category_cache
+from .models import Category, Expenses, ExpenseChange, PurgeJob
+from .sync import record_changes
+
+# One purge at a time per process keeps the delete load on the database bounded
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='purge')
+
+
+def start_purge(target, obj):
+    # Deactivate the owner now and queue the purge of its expenses
+    with transaction.atomic():
+        if target == 'user':
+            User.objects.filter(pk=obj.pk).update(is_active=False)
+        else:
+            # update() skips post_save, so refresh the category cache directly
+            Category.objects.filter(pk=obj.pk).update(is_active=False)
+            category_cache.invalidate()
+            transaction.on_commit(category_cache.invalidate)
+        job = PurgeJob.objects.create(target=target, object_id=obj.pk)
+        transaction.on_commit(lambda: _executor.submit(_run_in_worker, job.pk))
+    return job
+
+
+def _delete_batch(table, column, value, batch_size, returning_user=False):
+    # Delete up to `batch_size` rows of `table` where `column` = `value` with
+    # plain SQL, so no rows are loaded into model instances
+    quote = connection.ops.quote_name
+    select_columns = 'id, user_id' if returning_user else 'id'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {select_columns} FROM {quote(table)} WHERE {quote(column)} = %s LIMIT %s",
+            [value, batch_size]
+        )
+        rows = cursor.fetchall()
+        if rows:
+            placeholders = ', '.join(['%s'] * len(rows))
+            cursor.execute(
+                f"DELETE FROM {quote(table)} WHERE id IN ({placeholders})",
+                [row[0] for row in rows]
+            )
+    return rows
+
+
+def purge_expense_batch(job, batch_size):
+    # Delete one batch of the owner's expenses and record progress in the same
+    # transaction, so a crash never loses or double counts a batch
+    column = 'user_id' if job.target == 'user' else 'category_id'
+    with transaction.atomic():
+        rows = _delete_batch(Expenses._meta.db_table, column, job.object_id, batch_size, returning_user=True)
+
+        # Other users' sync clients need tombstones for a removed category;
+        # a deleted user has no clients left to sync
+        if job.target == 'category':
+            by_user = {}
+            for expense_id, user_id in rows:
+                by_user.setdefault(user_id, []).append(expense_id)
+            for user_id, expense_ids in by_user.items():
+                record_changes(user_id, expense_ids, deleted=True)
+
+        # updated_at doubles as the worker's heartbeat for the lease
+        PurgeJob.objects.filter(pk=job.pk).update(
+            deleted_count=F('deleted_count') + len(rows),
+            updated_at=timezone.now()
+        )
+    return len(rows)
+
+
+def claim_purge_job(job_id):
+    # Atomically take a job that is pending or failed, or one whose worker
+    # has not reported progress for PURGE_LEASE_SECONDS; a live job is left
+    # to the worker running it
+    stale = timezone.now() - timedelta(seconds=settings.PURGE_LEASE_SECONDS)
+    return PurgeJob.objects.filter(pk=job_id).filter(
+        Q(status__in=['pending', 'failed']) | Q(status='running', updated_at__lt=stale)
+    ).update(status='running', error='', updated_at=timezone.now())
+
+
+def run_purge_job(job_id, batch_size=None):
+    # Purge in batches until nothing is left, then delete the owner itself.
+    # Safe to re-run after a crash: every step only deletes what remains
+    batch_size = batch_size or settings.PURGE_BATCH_SIZE
+    if not claim_purge_job(job_id):
+        return PurgeJob.objects.get(pk=job_id)
+
+    job = PurgeJob.objects.get(pk=job_id)
+    if job.total is None:
+        column = 'user' if job.target == 'user' else 'category'
+        job.total = Expenses.objects.filter(**{column: job.object_id}).count()
+        job.save(update_fields=['total', 'updated_at'])
+
+    try:
+        while purge_expense_batch(job, batch_size):
+            pass
+
+        if job.target == 'user':
+            while _delete_batch(ExpenseChange._meta.db_table, 'user_id', job.object_id, batch_size):
+                PurgeJob.objects.filter(pk=job.pk).update(updated_at=timezone.now())
+            User.objects.filter(pk=job.object_id).delete()
+        else:
+            Category.objects.filter(pk=job.object_id).delete()
+
+        job.status = 'completed'
+        job.completed_at = timezone.now()
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e)
+
+    job.save(update_fields=['status', 'error', 'completed_at', 'updated_at'])
+    return job
+
+
+def _run_in_worker(job_id):
+    try:
+        run_purge_job(job_id)
+    finally:
+        # Worker threads hold their own connection; release it between jobs
+        connection.close()
@@ -0,0 +1,131 @@
+import calendar
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from .budgets import apply_spend_deltas, month_start
+from .models import Budget, Expenses, RecurringExpense
+from .sync import record_changes
+
+
+def add_months(anchor, current, months):
+    # Step `current` forward by `months`, keeping the anchor's day of month
+    # and clamping it to the length of the target month
+    month_index = current.year * 12 + current.month - 1 + months
+    year, month = divmod(month_index, 12)
+    month += 1
+    day = min(anchor.day, calendar.monthrange(year, month)[1])
+    return current.replace(year=year, month=month, day=day)
+
+
+def next_occurrence(template, current):
+    if template.frequency == 'weekly':
+        return current + timedelta(days=7)
+    if template.frequency == 'monthly':
+        return add_months(template.start_date, current, 1)
+    return add_months(template.start_date, current, 12)
+
+
+def rescheduled_next_date(template):
+    # First occurrence of the template's current schedule after the last one
+    # already materialized, so a schedule change neither repeats nor skips
+    last = template.occurrences.order_by('-occurrence_date').values_list('occurrence_date', flat=True).first()
+    current = template.start_date
+    while last is not None and current <= last:
+        current = next_occurrence(template, current)
+    return current
+
+
+def due_occurrences(template, today):
+    # Every occurrence from next_date up to today, within end_date
+    last = min(today, template.end_date) if template.end_date else today
+    current = template.next_date
+    while current <= last:
+        yield current
+        current = next_occurrence(template, current)
+
+
+def track_budget_spend(expenses):
+    # bulk_create skips post_save; add new rows to the budgets that exist,
+    # found with one query for the whole batch
+    budgeted = set(Budget.objects.filter(
+        user__in={expense.user_id for expense in expenses}
+    ).values_list('user_id', 'category_id'))
+
+    deltas = defaultdict(lambda: defaultdict(Decimal))
+    for expense in expenses:
+        if (expense.user_id, expense.category_id) in budgeted:
+            deltas[expense.user_id][(expense.category_id, month_start(expense.date))] += expense.amount
+    for user_id, user_deltas in deltas.items():
+        apply_spend_deltas(user_id, user_deltas)
+
+
+def materialize_batch(templates, today):
+    # Insert the due expenses of a batch of templates and advance them, in one
+    # transaction. Re-running after a crash is safe: the unique
+    # (recurring, occurrence_date) constraint skips rows that already exist
+    expenses = []
+    first_dates = {}
+    for template in templates:
+        first_dates[template.pk] = template.next_date
+        for occurrence in due_occurrences(template, today):
+            expenses.append(Expenses(
+                user_id=template.user_id,
+                category_id=template.category_id,
+                amount=template.amount,
+                description=template.description,
+                date=occurrence,
+                recurring_id=template.pk,
+                occurrence_date=occurrence
+            ))
+            template.next_date = next_occurrence(template, occurrence)
+        if template.end_date and template.next_date > template.end_date:
+            template.is_active = False
+
+    with transaction.atomic():
+        # Skip occurrences a previous, interrupted run already created, so
+        # budget totals only count new rows
+        existing = set(Expenses.objects.filter(
+            recurring__in=list(first_dates),
+            occurrence_date__gte=min(first_dates.values()),
+            occurrence_date__lte=today
+        ).values_list('recurring_id', 'occurrence_date'))
+        expenses = [expense for expense in expenses if (expense.recurring_id, expense.occurrence_date) not in existing]
+
+        Expenses.objects.bulk_create(expenses, ignore_conflicts=True)
+        RecurringExpense.objects.bulk_update(templates, ['next_date', 'is_active'])
+        track_budget_spend(expenses)
+
+        # bulk_create skips post_save, so log the new rows for delta sync;
+        # ids are not returned with ignore_conflicts, so look them up by key
+        new_keys = {(expense.recurring_id, expense.occurrence_date) for expense in expenses}
+        created = Expenses.objects.filter(
+            recurring__in=list(first_dates),
+            occurrence_date__gte=min(first_dates.values()),
+            occurrence_date__lte=today
+        ).values_list('id', 'user_id', 'recurring_id', 'occurrence_date')
+        by_user = {}
+        for expense_id, user_id, recurring_id, occurrence_date in created:
+            if (recurring_id, occurrence_date) in new_keys:
+                by_user.setdefault(user_id, []).append(expense_id)
+        for user_id, expense_ids in by_user.items():
+            record_changes(user_id, expense_ids)
+
+    return len(expenses)
+
+
+def materialize_recurring_expenses(today, batch_size=None):
+    # Walk due templates in id order, one batch per transaction
+    batch_size = batch_size or settings.RECURRING_BATCH_SIZE
+    due = RecurringExpense.objects.filter(is_active=True, next_date__lte=today).order_by('id')
+    created = 0
+    last_id = 0
+    while True:
+        templates = list(due.filter(id__gt=last_id)[:batch_size])
+        if not templates:
+            return created
+        created += materialize_batch(templates, today)
+        last_id = templates[-1].pk
@@ -0,0 +1,240 @@
+import calendar
+import csv
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import Case, Count, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import TruncDay, TruncMonth
+from django.utils import timezone
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table
+
+from .models import Expenses, ReportJob
+
+# Reports are rendered off the request thread so gunicorn workers stay free
+_executor = ThreadPoolExecutor(max_workers=settings.REPORT_WORKERS, thread_name_prefix='reports')
+
+
+def summarize_expenses(expenses):
+    # Totals, per-category breakdown and date range for a queryset of expenses
+    total_spent = expenses.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+
+    category_summary = expenses.values('category__name').annotate(
+        total=Sum('amount'),
+        count=Count('id')
+    ).order_by('-total')
+
+    categories = {
+        item['category__name']: {
+            'total': item['total'],
+            'count': item['count']
+        }
+        for item in category_summary
+    }
+
+    date_range_data = expenses.aggregate(
+        earliest=Min('date'),
+        latest=Max('date')
+    )
+
+    date_range = {}
+    if date_range_data['earliest'] and date_range_data['latest']:
+        date_range = {
+            'earliest': date_range_data['earliest'].isoformat(),
+            'latest': date_range_data['latest'].isoformat()
+        }
+
+    return {
+        'total_spent': total_spent,
+        'categories': categories,
+        'expense_count': expenses.count(),
+        'date_range': date_range
+    }
+
+
+def period_range(period, year, month=None):
+    # First and last day covered by a monthly or yearly report
+    if period == 'monthly':
+        return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+    return date(year, 1, 1), date(year, 12, 31)
+
+
+def expenses_for_job(job):
+    return Expenses.objects.filter(
+        user=job.user_id,
+        date__gte=job.date_from,
+        date__lte=job.date_to
+    )
+
+
+def fingerprint_expenses(expenses):
+    # Cheap signature of the rows in range; changes whenever they are added,
+    # removed or edited, so an identical fingerprint means the report is reusable
+    data = expenses.order_by().aggregate(
+        count=Count('id'),
+        total=Sum('amount'),
+        last_id=Max('id'),
+        last_updated=Max('updated_at'),
+        # category names appear in the report, so a rename must change it too
+        category_updated=Max('category__updated_at')
+    )
+    raw = '|'.join(str(data[key]) for key in ('count', 'total', 'last_id', 'last_updated', 'category_updated'))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def find_cached_report(job):
+    # Completed or live in-flight report for the same user, period, range and
+    # data, if any; completed results are preferred. Jobs whose worker is
+    # presumed lost are left to resume_report_jobs
+    cutoff = stale_before()
+    return ReportJob.objects.filter(
+        user=job.user_id,
+        period=job.period,
+        format=job.format,
+        date_from=job.date_from,
+        date_to=job.date_to,
+        fingerprint=job.fingerprint
+    ).filter(
+        Q(status='completed')
+        | Q(status='pending', created_at__gte=cutoff)
+        | Q(status='running', started_at__gte=cutoff)
+    ).exclude(pk=job.pk).order_by(
+        Case(When(status='completed', then=Value(0)), default=Value(1)), '-created_at'
+    ).first()
+
+
+def stale_before():
+    return timezone.now() - timedelta(seconds=settings.REPORT_STALE_SECONDS)
+
+
+def claim_report_job(job_id):
+    # Atomically mark a job as running; a job another worker is still running
+    # is only taken over once its claim has gone stale
+    return ReportJob.objects.filter(pk=job_id).filter(
+        Q(status='pending') | Q(status='running', started_at__lt=stale_before())
+    ).update(status='running', started_at=timezone.now())
+
+
+def stale_report_jobs():
+    # Jobs whose worker was lost to a restart: never picked up, or running
+    # for longer than REPORT_STALE_SECONDS
+    cutoff = stale_before()
+    return ReportJob.objects.filter(
+        Q(status='pending', created_at__lt=cutoff) | Q(status='running', started_at__lt=cutoff)
+    )
+
+
+def build_report_data(job):
+    expenses = expenses_for_job(job)
+    summary = summarize_expenses(expenses)
+
+    # Yearly reports break down by month, monthly reports by day
+    trunc = TruncMonth('date') if job.period == 'yearly' else TruncDay('date')
+    breakdown = expenses.order_by().annotate(bucket=trunc).values('bucket').annotate(
+        total=Sum('amount'),
+        count=Count('id')
+    ).order_by('bucket')
+
+    summary['breakdown'] = [
+        {
+            'period': item['bucket'].strftime('%Y-%m' if job.period == 'yearly' else '%Y-%m-%d'),
+            'total': item['total'],
+            'count': item['count']
+        }
+        for item in breakdown
+    ]
+    return summary
+
+
+def format_amount(value):
+    return f"{value:.2f}"
+
+
+def render_csv(job, data):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['Report', job.period, job.date_from.isoformat(), job.date_to.isoformat()])
+    writer.writerow(['Total spent', format_amount(data['total_spent'])])
+    writer.writerow(['Expense count', data['expense_count']])
+    writer.writerow([])
+    writer.writerow(['Category', 'Total', 'Count'])
+    for name, item in data['categories'].items():
+        writer.writerow([name, format_amount(item['total']), item['count']])
+    writer.writerow([])
+    writer.writerow(['Period', 'Total', 'Count'])
+    for item in data['breakdown']:
+        writer.writerow([item['period'], format_amount(item['total']), item['count']])
+    return output.getvalue().encode()
+
+
+def render_pdf(job, data):
+    output = io.BytesIO()
+    styles = getSampleStyleSheet()
+    title = f"{job.period.capitalize()} expense report: {job.date_from.isoformat()} to {job.date_to.isoformat()}"
+
+    story = [
+        Paragraph(title, styles['Title']),
+        Paragraph(f"Total spent: {format_amount(data['total_spent'])}", styles['Normal']),
+        Paragraph(f"Expense count: {data['expense_count']}", styles['Normal']),
+        Spacer(1, 12),
+        Paragraph('By category', styles['Heading2']),
+        Table([['Category', 'Total', 'Count']] + [
+            [name, format_amount(item['total']), item['count']]
+            for name, item in data['categories'].items()
+        ]),
+        Spacer(1, 12),
+        Paragraph('Breakdown', styles['Heading2']),
+        Table([['Period', 'Total', 'Count']] + [
+            [item['period'], format_amount(item['total']), item['count']]
+            for item in data['breakdown']
+        ]),
+    ]
+    SimpleDocTemplate(output, pagesize=A4).build(story)
+    return output.getvalue()
+
+
+RENDERERS = {
+    'csv': render_csv,
+    'pdf': render_pdf,
+}
+
+
+def run_report_job(job_id):
+    # Render the report and store it under MEDIA_ROOT
+    if not claim_report_job(job_id):
+        return None
+    job = ReportJob.objects.get(pk=job_id)
+
+    try:
+        data = build_report_data(job)
+        content = RENDERERS[job.format](job, data)
+        filename = f"{job.user_id}_{job.period}_{job.date_from.isoformat()}_{job.pk}.{job.format}"
+        job.file.save(filename, ContentFile(content), save=False)
+        job.status = 'completed'
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e)
+
+    job.completed_at = timezone.now()
+    job.save(update_fields=['status', 'file', 'error', 'completed_at'])
+    return job
+
+
+def _run_in_worker(job_id):
+    try:
+        run_report_job(job_id)
+    finally:
+        # Worker threads hold their own connection; release it between jobs
+        connection.close()
+
+
+def enqueue_report(job):
+    # Hand the job to the pool once the row is visible to other connections
+    transaction.on_commit(lambda: _executor.submit(_run_in_worker, job.pk))
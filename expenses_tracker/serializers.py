@@ -3,7 +3,10 @@ from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth.hashers import make_password
+from django.urls import reverse
 from . models import *
+from .category_cache import category_cache
+from .recurring import rescheduled_next_date
 
 
 class RegistrationSerializer(serializers.ModelSerializer):
@@ -86,9 +89,53 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'description', 'created_at')
         read_only_fields = ('id', 'created_at')
 
-class ExpenseSerializer(serializers.ModelSerializer):
-    category_name = serializers.CharField(source='category.name', read_only=True)
+class CachedCategoryField(serializers.PrimaryKeyRelatedField):
+    # Validates the category id against the in-process category cache
+    # instead of querying the Category table
+    def __init__(self, **kwargs):
+        kwargs.setdefault('queryset', Category.objects.all())
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+        row = category_cache.get(pk, recheck_missing=True)
+        if row is None:
+            self.fail('does_not_exist', pk_value=data)
+        return Category(**row)
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    # Takes an optional `fields` argument that limits which fields are serialized
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+class ExpenseSerializer(DynamicFieldsModelSerializer):
+    category = CachedCategoryField()
+    category_name = serializers.SerializerMethodField()
     user = serializers.StringRelatedField(read_only=True)
+
+    # Model columns each serialized field needs, used to narrow the SELECT
+    field_columns = {
+        'id': ('id',),
+        'user': ('user',),
+        'category': ('category',),
+        'category_name': ('category',),
+        'amount': ('amount',),
+        'description': ('description',),
+        'date': ('date',),
+        'created_at': ('created_at',),
+        'updated_at': ('updated_at',),
+    }
     
     class Meta:
         model = Expenses
@@ -97,6 +144,9 @@ class ExpenseSerializer(serializers.ModelSerializer):
             'description', 'date', 'created_at', 'updated_at'
         )
         read_only_fields = ('id', 'user', 'created_at', 'updated_at')
+
+    def get_category_name(self, obj):
+        return category_cache.get_name(obj.category_id)
     
     def validate_amount(self, value):
         if value <= 0:
@@ -104,6 +154,8 @@ class ExpenseSerializer(serializers.ModelSerializer):
         return value
 
 class ExpenseCreateSerializer(serializers.ModelSerializer):
+    category = CachedCategoryField()
+
     class Meta:
         model = Expenses
         fields = ('category', 'amount', 'description', 'date')
@@ -113,11 +165,199 @@ class ExpenseCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Amount must be greater than zero")
         return value
 
+# Most expenses a single bulk request may change
+BULK_LIMIT = 10000
+
+
+class ExpenseBulkSerializer(serializers.Serializer):
+    # Selects expenses by id or by the expense list filters
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False, max_length=BULK_LIMIT)
+    filter = serializers.DictField(child=serializers.CharField(), required=False, allow_empty=False)
+
+    def validate_filter(self, value):
+        unknown = set(value) - {'category', 'date_from', 'date_to'}
+        if unknown:
+            raise serializers.ValidationError(f"Unknown filters: {', '.join(sorted(unknown))}")
+
+        # The list view skips malformed dates; here that would widen a bulk
+        # delete to every expense, so reject them instead
+        for key in ('date_from', 'date_to'):
+            if key in value:
+                try:
+                    value[key] = serializers.DateField().run_validation(value[key]).isoformat()
+                except serializers.ValidationError as e:
+                    raise serializers.ValidationError({key: e.detail})
+        return value
+
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('filter' in attrs):
+            raise serializers.ValidationError("Provide either ids or filter.")
+        return attrs
+
+class ExpenseBulkChangesSerializer(serializers.Serializer):
+    category = CachedCategoryField(required=False)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    description = serializers.CharField(required=False)
+    date = serializers.DateField(required=False)
+
+    def validate_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Amount must be greater than zero")
+        return value
+
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError("No changes given.")
+        return attrs
+
+class ExpenseBulkUpdateSerializer(ExpenseBulkSerializer):
+    changes = ExpenseBulkChangesSerializer()
+
+class ExpenseChangesSerializer(serializers.Serializer):
+    changed = ExpenseSerializer(many=True)
+    deleted = serializers.ListField(child=serializers.IntegerField())
+    next_token = serializers.CharField()
+    has_more = serializers.BooleanField()
+
+class RecurringExpenseSerializer(serializers.ModelSerializer):
+    category = CachedCategoryField()
+    category_name = serializers.SerializerMethodField()
+
+    class Meta:
+        model = RecurringExpense
+        fields = (
+            'id', 'category', 'category_name', 'amount', 'description', 'frequency',
+            'start_date', 'end_date', 'next_date', 'is_active', 'created_at', 'updated_at'
+        )
+        read_only_fields = ('id', 'next_date', 'is_active', 'created_at', 'updated_at')
+
+    def get_category_name(self, obj):
+        return category_cache.get_name(obj.category_id)
+
+    def validate_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Amount must be greater than zero")
+        return value
+
+    def validate(self, attrs):
+        start_date = attrs.get('start_date', getattr(self.instance, 'start_date', None))
+        end_date = attrs.get('end_date', getattr(self.instance, 'end_date', None))
+        if end_date and start_date and end_date < start_date:
+            raise serializers.ValidationError("End date must not be before start date.")
+        return attrs
+
+    def create(self, validated_data):
+        validated_data['next_date'] = validated_data['start_date']
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        # A new start date or frequency restarts the schedule after the last
+        # occurrence already created
+        next_date = instance.next_date
+        schedule = {field: validated_data[field] for field in ('start_date', 'frequency') if field in validated_data}
+        if any(getattr(instance, field) != value for field, value in schedule.items()):
+            for field, value in schedule.items():
+                setattr(instance, field, value)
+            next_date = rescheduled_next_date(instance)
+            validated_data['next_date'] = next_date
+
+        # A schedule change or a new end date (such as extending an ended
+        # template) decides whether the template still has occurrences to run
+        if 'next_date' in validated_data or 'end_date' in validated_data:
+            end_date = validated_data.get('end_date', instance.end_date)
+            validated_data['is_active'] = end_date is None or next_date <= end_date
+        return super().update(instance, validated_data)
+
+class BudgetSerializer(serializers.ModelSerializer):
+    category = CachedCategoryField()
+    category_name = serializers.SerializerMethodField()
+    remaining = serializers.SerializerMethodField()
+    percent_used = serializers.SerializerMethodField()
+    threshold_crossed = serializers.SerializerMethodField()
+    over_budget = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Budget
+        fields = (
+            'id', 'category', 'category_name', 'amount', 'threshold', 'period_start', 'spent',
+            'remaining', 'percent_used', 'threshold_crossed', 'threshold_crossed_at', 'over_budget'
+        )
+        read_only_fields = ('id', 'period_start', 'spent', 'threshold_crossed_at')
+
+    def get_category_name(self, obj):
+        return category_cache.get_name(obj.category_id)
+
+    def get_remaining(self, obj):
+        return str(obj.amount - obj.spent)
+
+    def get_percent_used(self, obj):
+        return round(float(obj.spent / obj.amount * 100), 1)
+
+    def get_threshold_crossed(self, obj):
+        return obj.threshold_crossed_at is not None
+
+    def get_over_budget(self, obj):
+        return obj.spent > obj.amount
+
+    def validate_threshold(self, value):
+        if not 1 <= value <= 100:
+            raise serializers.ValidationError("Threshold must be between 1 and 100 percent")
+        return value
+
+    def validate_category(self, value):
+        user = self.context['request'].user
+        budgets = Budget.objects.filter(user=user, category=value.pk)
+        if self.instance:
+            budgets = budgets.exclude(pk=self.instance.pk)
+        if budgets.exists():
+            raise serializers.ValidationError("A budget for this category already exists.")
+        return value
+
 class ExpenseSummarySerializer(serializers.Serializer):
     total_spent = serializers.DecimalField(max_digits=12, decimal_places=2)
     categories = serializers.DictField()
     expense_count = serializers.IntegerField()
     date_range = serializers.DictField()
 
-        
+class ExpenseStatsSerializer(serializers.Serializer):
+    expense_count = serializers.IntegerField()
+    categories = serializers.DictField()
+    outliers = serializers.ListField(child=serializers.DictField())
+
+class ReportRequestSerializer(serializers.Serializer):
+    period = serializers.ChoiceField(choices=ReportJob.PERIOD_CHOICES)
+    format = serializers.ChoiceField(choices=ReportJob.FORMAT_CHOICES)
+    year = serializers.IntegerField(min_value=1900, max_value=9999)
+    month = serializers.IntegerField(min_value=1, max_value=12, required=False)
+
+    def validate(self, attrs):
+        if attrs['period'] == 'monthly' and not attrs.get('month'):
+            raise serializers.ValidationError("Month is required for monthly reports.")
+        return attrs
 
+class ReportJobSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReportJob
+        fields = (
+            'id', 'period', 'format', 'date_from', 'date_to', 'status',
+            'error', 'created_at', 'completed_at', 'download_url'
+        )
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        if obj.status != 'completed':
+            return None
+        request = self.context.get('request')
+        url = reverse('report-download', args=[obj.pk])
+        return request.build_absolute_uri(url) if request else url
+
+class PurgeJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PurgeJob
+        fields = (
+            'id', 'target', 'object_id', 'status', 'total', 'deleted_count',
+            'error', 'created_at', 'updated_at', 'completed_at'
+        )
+        read_only_fields = fields
@@ -0,0 +1,107 @@
+import numpy as np
+
+from .category_cache import category_cache
+from .models import Category
+
+# Maximum number of outlier expenses returned in a single response
+OUTLIER_LIMIT = 100
+
+# Rows fetched per round trip while streaming expenses into NumPy
+CHUNK_SIZE = 5000
+
+ROW_DTYPE = np.dtype([
+    ('id', 'i8'),
+    ('amount', 'f8'),
+    ('date', 'M8[D]'),
+    ('category', 'i8'),
+])
+
+
+def category_names(category_ids):
+    # Names from the cache; deactivated categories awaiting purge are not
+    # cached, so look those up in one query
+    names = {pk: category_cache.get_name(pk) for pk in category_ids}
+    missing = [pk for pk, name in names.items() if name is None]
+    if missing:
+        names.update(Category.objects.filter(pk__in=missing).values_list('id', 'name'))
+    return names
+
+
+def load_expense_arrays(expenses):
+    # Stream the needed columns straight into a structured array, without
+    # building model instances
+    rows = expenses.order_by().values_list('id', 'amount', 'date', 'category_id')
+    return np.fromiter(
+        ((pk, float(amount), date, category) for pk, amount, date, category in rows.iterator(chunk_size=CHUNK_SIZE)),
+        dtype=ROW_DTYPE
+    )
+
+
+def group_percentile(sorted_amounts, starts, counts, q):
+    # Linear-interpolated percentile of every group at once; each group is a
+    # contiguous, ascending slice of `sorted_amounts`
+    position = starts + (counts - 1) * (q / 100.0)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.ceil(position).astype(np.int64)
+    fraction = position - lower
+    return sorted_amounts[lower] + (sorted_amounts[upper] - sorted_amounts[lower]) * fraction
+
+
+def compute_spending_stats(expenses):
+    # Per-category median, p90, p99, mean, standard deviation and Tukey
+    # outliers (outside 1.5 * IQR) for a queryset of expenses
+    data = load_expense_arrays(expenses)
+    if data.size == 0:
+        return {'expense_count': 0, 'categories': {}, 'outliers': []}
+
+    # Sort by category then amount so each category is one ascending run
+    data = data[np.lexsort((data['amount'], data['category']))]
+    amounts = data['amount']
+    category_ids, starts, counts = np.unique(data['category'], return_index=True, return_counts=True)
+    group = np.repeat(np.arange(category_ids.size), counts)
+
+    means = np.add.reduceat(amounts, starts) / counts
+    stds = np.sqrt(np.add.reduceat((amounts - means[group]) ** 2, starts) / counts)
+    medians = group_percentile(amounts, starts, counts, 50)
+    p90 = group_percentile(amounts, starts, counts, 90)
+    p99 = group_percentile(amounts, starts, counts, 99)
+    q1 = group_percentile(amounts, starts, counts, 25)
+    q3 = group_percentile(amounts, starts, counts, 75)
+
+    iqr = q3 - q1
+    is_outlier = (amounts < (q1 - 1.5 * iqr)[group]) | (amounts > (q3 + 1.5 * iqr)[group])
+    outlier_counts = np.bincount(group[is_outlier], minlength=category_ids.size)
+
+    names = category_names(category_ids.tolist())
+    categories = {}
+    for i, category_id in enumerate(category_ids.tolist()):
+        categories[str(category_id)] = {
+            'name': names[category_id],
+            'count': int(counts[i]),
+            'mean': round(float(means[i]), 2),
+            'median': round(float(medians[i]), 2),
+            'p90': round(float(p90[i]), 2),
+            'p99': round(float(p99[i]), 2),
+            'std_dev': round(float(stds[i]), 2),
+            'outlier_count': int(outlier_counts[i]),
+        }
+
+    # Largest outliers first
+    flagged = data[is_outlier]
+    flagged = flagged[np.argsort(-flagged['amount'], kind='stable')][:OUTLIER_LIMIT]
+    outliers = [
+        {
+            'id': int(row['id']),
+            'category': int(row['category']),
+            'category_name': names[int(row['category'])],
+            'amount': f"{row['amount']:.2f}",
+            'date': str(row['date']),
+        }
+        for row in flagged
+    ]
+
+    return {
+        'expense_count': int(data.size),
+        'categories': categories,
+        'outliers': outliers,
+    }
@@ -0,0 +1,97 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Expenses, ExpenseChange
+
+
+class SyncTokenExpired(Exception):
+    # The client's token is older than the retained change log
+    pass
+
+
+def record_changes(user_id, expense_ids, deleted=False):
+    # Log a batch of expense writes; used by bulk operations that bypass signals
+    ExpenseChange.objects.bulk_create([
+        ExpenseChange(user_id=user_id, expense_id=expense_id, deleted=deleted)
+        for expense_id in expense_ids
+    ])
+
+
+@receiver(post_save, sender=Expenses)
+def log_expense_saved(sender, instance, **kwargs):
+    ExpenseChange.objects.create(user_id=instance.user_id, expense_id=instance.pk)
+
+
+@receiver(post_delete, sender=Expenses)
+def log_expense_deleted(sender, instance, origin=None, **kwargs):
+    # Deleting a user cascades to its expenses after its change log is gone;
+    # there is no client left to sync, and a new row would break the FK
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin_model is User:
+        return
+    ExpenseChange.objects.create(user_id=instance.user_id, expense_id=instance.pk, deleted=True)
+
+
+def settled_before():
+    # Ids are handed out at insert time but become visible at commit, so a
+    # fresh entry may still have a lower-id neighbour in a transaction that
+    # has not committed. Entries younger than SYNC_SAFETY_LAG_SECONDS are held
+    # back; writers must commit within that time for tokens to stay exact
+    return timezone.now() - timedelta(seconds=settings.SYNC_SAFETY_LAG_SECONDS)
+
+
+def current_token():
+    # Id of the newest settled change; a client holding it has seen everything
+    # up to the safety lag, and may see a few later changes twice
+    return ExpenseChange.objects.filter(created_at__lt=settled_before()).order_by('-id').values_list(
+        'id', flat=True
+    ).first() or 0
+
+
+def changes_since(user, since, limit):
+    # Expenses changed and ids deleted after `since`, at most `limit` log entries
+    oldest = ExpenseChange.objects.order_by('id').values_list('id', flat=True).first()
+    if oldest is not None and since < oldest - 1:
+        raise SyncTokenExpired()
+
+    entries = list(
+        ExpenseChange.objects.filter(user=user, id__gt=since)
+        .order_by('id')
+        .values_list('id', 'expense_id', 'created_at')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    # Stop at the first unsettled entry, so the token never moves past an id
+    # whose neighbours may still commit; the client picks it up next poll
+    cutoff = settled_before()
+    for index, (_, _, created_at) in enumerate(entries):
+        if created_at >= cutoff:
+            entries = entries[:index]
+            has_more = False
+            break
+    if not entries:
+        return [], [], since, False
+
+    # An expense may appear several times; only its current state matters, and
+    # ids that no longer exist are tombstones
+    expense_ids = {expense_id for _, expense_id, _ in entries}
+    changed = list(Expenses.objects.filter(user=user, id__in=expense_ids).select_related('user'))
+    deleted = sorted(expense_ids - {expense.id for expense in changed})
+    return changed, deleted, entries[-1][0], has_more
+
+
+def prune_change_log(days=None):
+    # Drop log entries past the retention window, always keeping the newest one
+    # so expired tokens can still be detected
+    days = settings.SYNC_LOG_RETENTION_DAYS if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    newest = current_token()
+    deleted, _ = ExpenseChange.objects.filter(created_at__lt=cutoff).exclude(id=newest).delete()
+    return deleted
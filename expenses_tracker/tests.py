@@ -1,4 +1,16 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+import numpy as np
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.db.models.signals import post_delete
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.urls import reverse
 from rest_framework.test import APITestCase
@@ -7,7 +19,13 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from decimal import Decimal
 from datetime import date, timedelta
 
-from .models import Category, Expenses
+from .models import Budget, Category, Expenses, ExpenseChange, PurgeJob, RecurringExpense, ReportJob, RequestProfile
+from .reports import run_report_job
+from .category_cache import category_cache
+from .sync import prune_change_log
+from .purge import start_purge, run_purge_job, purge_expense_batch
+from .recurring import materialize_recurring_expenses
+from .profiling import make_profile_token
 
 class ExpenseModelTest(TestCase):
     def setUp(self):
@@ -214,4 +232,955 @@ class CategoryAPITest(APITestCase):
         }
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        self.assertTrue(Category.objects.filter(name='Entertainment').exists())
\ No newline at end of file
+        self.assertTrue(Category.objects.filter(name='Entertainment').exists())
+
+class ExpenseSparseFieldsTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.category = Category.objects.create(name='Food')
+        self.expense = Expenses.objects.create(
+            user=self.user,
+            category=self.category,
+            amount=Decimal('15.00'),
+            description='Coffee',
+            date=date.today()
+        )
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_list_returns_only_requested_fields(self):
+        url = reverse('expense-list-create')
+        response = self.client.get(url, {'fields': 'id,amount,date'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'amount', 'date'})
+        self.assertEqual(response.data['results'][0]['amount'], '15.00')
+
+    def test_list_skips_category_join(self):
+        url = reverse('expense-list-create')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'fields': 'id,amount'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        select = [q['sql'] for q in queries if 'expenses_tracker_expenses"."amount' in q['sql']][-1]
+        self.assertNotIn('JOIN', select)
+        self.assertNotIn('"description"', select)
+
+    def test_detail_with_category_name(self):
+        url = reverse('expense-detail', args=[self.expense.id])
+        response = self.client.get(url, {'fields': 'id,category_name'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'id': self.expense.id, 'category_name': 'Food'})
+
+    def test_unknown_field_rejected(self):
+        url = reverse('expense-list-create')
+        response = self.client.get(url, {'fields': 'id,password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ReportJobAPITest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.category = Category.objects.create(name='Food')
+        Expenses.objects.create(
+            user=self.user,
+            category=self.category,
+            amount=Decimal('15.00'),
+            description='Coffee',
+            date=date(2025, 3, 10)
+        )
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def submit(self, **data):
+        with mock.patch('expenses_tracker.views.enqueue_report') as enqueue:
+            response = self.client.post(reverse('report-list-create'), data)
+        if enqueue.called:
+            run_report_job(enqueue.call_args[0][0].pk)
+        return response
+
+    def test_submit_poll_and_download_csv(self):
+        response = self.submit(period='monthly', format='csv', year=2025, month=3)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        detail = self.client.get(reverse('report-detail', args=[response.data['id']]))
+        self.assertEqual(detail.data['status'], 'completed')
+
+        download = self.client.get(reverse('report-download', args=[response.data['id']]))
+        self.assertEqual(download.status_code, status.HTTP_200_OK)
+        content = b''.join(download.streaming_content).decode()
+        self.assertIn('Food,15.00,1', content)
+        self.assertIn('2025-03-10,15.00,1', content)
+
+    def test_pdf_report(self):
+        response = self.submit(period='yearly', format='pdf', year=2025)
+        job = ReportJob.objects.get(pk=response.data['id'])
+        self.assertEqual(job.status, 'completed')
+        self.assertTrue(job.file.read().startswith(b'%PDF'))
+
+    def test_unchanged_data_reuses_report(self):
+        first = self.submit(period='yearly', format='csv', year=2025)
+        second = self.submit(period='yearly', format='csv', year=2025)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data['id'], first.data['id'])
+
+        Expenses.objects.create(
+            user=self.user,
+            category=self.category,
+            amount=Decimal('5.00'),
+            description='Tea',
+            date=date(2025, 4, 1)
+        )
+        third = self.submit(period='yearly', format='csv', year=2025)
+        self.assertEqual(third.status_code, status.HTTP_202_ACCEPTED)
+
+    def test_category_rename_changes_fingerprint(self):
+        first = self.submit(period='yearly', format='csv', year=2025)
+        self.category.name = 'Groceries'
+        self.category.save()
+        second = self.submit(period='yearly', format='csv', year=2025)
+        self.assertEqual(second.status_code, status.HTTP_202_ACCEPTED)
+        self.assertNotEqual(second.data['id'], first.data['id'])
+
+    def test_in_flight_report_is_reused(self):
+        with mock.patch('expenses_tracker.views.enqueue_report') as enqueue:
+            first = self.client.post(reverse('report-list-create'), {'period': 'yearly', 'format': 'csv', 'year': 2025})
+            second = self.client.post(reverse('report-list-create'), {'period': 'yearly', 'format': 'csv', 'year': 2025})
+        self.assertEqual(enqueue.call_count, 1)
+        self.assertEqual(second.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(second.data['id'], first.data['id'])
+
+    def test_stale_in_flight_report_not_reused(self):
+        with mock.patch('expenses_tracker.views.enqueue_report'):
+            first = self.client.post(reverse('report-list-create'), {'period': 'yearly', 'format': 'csv', 'year': 2025})
+        ReportJob.objects.filter(pk=first.data['id']).update(created_at=timezone.now() - timedelta(hours=1))
+        with mock.patch('expenses_tracker.views.enqueue_report') as enqueue:
+            second = self.client.post(reverse('report-list-create'), {'period': 'yearly', 'format': 'csv', 'year': 2025})
+        self.assertTrue(enqueue.called)
+        self.assertNotEqual(second.data['id'], first.data['id'])
+
+    def test_resume_picks_up_only_stale_jobs(self):
+        with mock.patch('expenses_tracker.views.enqueue_report'):
+            response = self.client.post(reverse('report-list-create'), {'period': 'yearly', 'format': 'csv', 'year': 2025})
+        job = ReportJob.objects.get(pk=response.data['id'])
+        ReportJob.objects.filter(pk=job.pk).update(status='running', started_at=timezone.now())
+
+        call_command('resume_report_jobs', stdout=io.StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'running')
+
+        ReportJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(hours=1))
+        call_command('resume_report_jobs', stdout=io.StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+
+    def test_monthly_requires_month(self):
+        response = self.submit(period='monthly', format='csv', year=2025)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CategoryCacheTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.category = Category.objects.create(name='Food', description='Food expenses')
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def category_queries(self, queries):
+        return [q['sql'] for q in queries if 'expenses_tracker_category' in q['sql']]
+
+    def test_create_expense_validates_category_from_cache(self):
+        category_cache.all()
+        url = reverse('expense-list-create')
+        data = {
+            'category': self.category.id,
+            'amount': '30.00',
+            'description': 'Dinner',
+            'date': date.today().isoformat()
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.category_queries(queries), [])
+
+    def test_unknown_category_rejected(self):
+        url = reverse('expense-list-create')
+        data = {
+            'category': self.category.id + 100,
+            'amount': '30.00',
+            'description': 'Dinner',
+            'date': date.today().isoformat()
+        }
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_category_list_served_from_cache(self):
+        category_cache.all()
+        url = reverse('category-list')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['description'], 'Food expenses')
+        self.assertEqual(self.category_queries(queries), [])
+
+    def test_new_category_invalidates_cache(self):
+        category_cache.all()
+        response = self.client.post(reverse('category-list'), {'name': 'Travel'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        names = [row['name'] for row in category_cache.all()]
+        self.assertEqual(names, ['Food', 'Travel'])
+
+    def test_expense_category_name_rendered_from_cache(self):
+        expense = Expenses.objects.create(
+            user=self.user,
+            category=self.category,
+            amount=Decimal('15.00'),
+            description='Coffee',
+            date=date.today()
+        )
+        response = self.client.get(reverse('expense-detail', args=[expense.id]))
+        self.assertEqual(response.data['category_name'], 'Food')
+
+    def test_page_checks_shared_version_once(self):
+        for day in range(1, 21):
+            Expenses.objects.create(
+                user=self.user,
+                category=self.category,
+                amount=Decimal('15.00'),
+                description='Coffee',
+                date=date(2025, 3, day)
+            )
+        category_cache.invalidate()
+        with mock.patch('expenses_tracker.category_cache.cache', wraps=cache) as shared:
+            response = self.client.get(reverse('expense-list-create'))
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertEqual(shared.get.call_count, 1)
+
+
+class ExpenseStatsAPITest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.food = Category.objects.create(name='Food')
+        self.transport = Category.objects.create(name='Transport')
+        self.food_amounts = [10, 12, 11, 13, 9, 10, 12, 200]
+        self.transport_amounts = [5, 7]
+        for category, amounts in ((self.food, self.food_amounts), (self.transport, self.transport_amounts)):
+            for amount in amounts:
+                Expenses.objects.create(
+                    user=self.user,
+                    category=category,
+                    amount=Decimal(amount),
+                    description='Expense',
+                    date=date(2025, 3, 10)
+                )
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_stats_match_numpy(self):
+        response = self.client.get(reverse('expense-stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['expense_count'], 10)
+
+        food = response.data['categories'][str(self.food.id)]
+        self.assertEqual(food['name'], 'Food')
+        self.assertEqual(food['count'], 8)
+        self.assertAlmostEqual(food['median'], float(np.median(self.food_amounts)), places=2)
+        self.assertAlmostEqual(food['p90'], round(float(np.percentile(self.food_amounts, 90)), 2), places=2)
+        self.assertAlmostEqual(food['p99'], round(float(np.percentile(self.food_amounts, 99)), 2), places=2)
+        self.assertAlmostEqual(food['mean'], round(float(np.mean(self.food_amounts)), 2), places=2)
+        self.assertAlmostEqual(food['std_dev'], round(float(np.std(self.food_amounts)), 2), places=2)
+        self.assertEqual(response.data['categories'][str(self.transport.id)]['median'], 6.0)
+
+    def test_outliers_flagged(self):
+        response = self.client.get(reverse('expense-stats'))
+        self.assertEqual(response.data['categories'][str(self.food.id)]['outlier_count'], 1)
+        self.assertEqual(len(response.data['outliers']), 1)
+        self.assertEqual(response.data['outliers'][0]['amount'], '200.00')
+        self.assertEqual(response.data['outliers'][0]['category'], self.food.id)
+        self.assertEqual(response.data['outliers'][0]['category_name'], 'Food')
+
+    def test_deactivated_categories_kept_apart(self):
+        Category.objects.filter(pk__in=[self.food.id, self.transport.id]).update(is_active=False)
+        category_cache.invalidate()
+        response = self.client.get(reverse('expense-stats'))
+        categories = response.data['categories']
+        self.assertEqual(categories[str(self.food.id)]['count'], 8)
+        self.assertEqual(categories[str(self.transport.id)]['count'], 2)
+        self.assertEqual(categories[str(self.transport.id)]['name'], 'Transport')
+
+    def test_empty_date_range(self):
+        response = self.client.get(reverse('expense-stats'), {'date_from': '2026-01-01'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['expense_count'], 0)
+        self.assertEqual(response.data['categories'], {})
+
+
+@override_settings(SYNC_SAFETY_LAG_SECONDS=0)
+class ExpenseChangesAPITest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.other_user = User.objects.create_user(
+            username='otheruser',
+            email='other@example.com',
+            password='testpass123'
+        )
+        self.category = Category.objects.create(name='Food')
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def create_expense(self, user=None, amount='15.00'):
+        return Expenses.objects.create(
+            user=user or self.user,
+            category=self.category,
+            amount=Decimal(amount),
+            description='Coffee',
+            date=date.today()
+        )
+
+    def sync(self, since, **params):
+        return self.client.get(reverse('expense-changes'), {'since': since, **params})
+
+    def test_bootstrap_returns_token(self):
+        self.create_expense()
+        response = self.client.get(reverse('expense-changes'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['changed'], [])
+        self.assertEqual(self.sync(response.data['next_token']).data['changed'], [])
+
+    def test_changes_and_tombstones_since_token(self):
+        kept = self.create_expense()
+        removed = self.create_expense()
+        token = self.client.get(reverse('expense-changes')).data['next_token']
+
+        kept.amount = Decimal('20.00')
+        kept.save()
+        self.client.delete(reverse('expense-detail', args=[removed.id]))
+        added = self.create_expense()
+        self.create_expense(user=self.other_user)
+
+        response = self.sync(token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({item['id'] for item in response.data['changed']}, {kept.id, added.id})
+        self.assertEqual(response.data['deleted'], [removed.id])
+        self.assertFalse(response.data['has_more'])
+        self.assertEqual(self.sync(response.data['next_token']).data['changed'], [])
+
+    def test_updated_at_changes_on_edit(self):
+        expense = self.create_expense()
+        created = expense.updated_at
+        expense.description = 'Tea'
+        expense.save()
+        self.assertGreater(expense.updated_at, created)
+
+    def test_paginates_with_limit(self):
+        token = self.client.get(reverse('expense-changes')).data['next_token']
+        for _ in range(3):
+            self.create_expense()
+        first = self.sync(token, limit=2)
+        self.assertEqual(len(first.data['changed']), 2)
+        self.assertTrue(first.data['has_more'])
+        second = self.sync(first.data['next_token'], limit=2)
+        self.assertEqual(len(second.data['changed']), 1)
+        self.assertFalse(second.data['has_more'])
+
+    def test_pruned_token_expired(self):
+        token = self.client.get(reverse('expense-changes')).data['next_token']
+        self.create_expense()
+        self.create_expense()
+        ExpenseChange.objects.update(created_at=timezone.now() - timedelta(days=60))
+        prune_change_log(days=30)
+        response = self.sync(token)
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+    @override_settings(SYNC_SAFETY_LAG_SECONDS=60)
+    def test_token_waits_for_unsettled_changes(self):
+        token = self.client.get(reverse('expense-changes')).data['next_token']
+        first = self.create_expense()
+        second = self.create_expense()
+        # The second change is settled but the first, with a lower id, may
+        # belong to a transaction that has only just committed
+        settled = timezone.now() - timedelta(seconds=120)
+        ExpenseChange.objects.filter(expense_id=second.id).update(created_at=settled)
+        response = self.sync(token)
+        self.assertEqual(response.data['changed'], [])
+        self.assertEqual(response.data['next_token'], token)
+
+        ExpenseChange.objects.update(created_at=settled)
+        response = self.sync(token)
+        self.assertEqual({row['id'] for row in response.data['changed']}, {first.id, second.id})
+
+    def test_deleting_user_with_expenses(self):
+        self.create_expense(user=self.other_user)
+        self.create_expense(user=self.other_user)
+        self.other_user.delete()
+        self.assertFalse(Expenses.objects.filter(user=self.other_user.pk).exists())
+        self.assertFalse(ExpenseChange.objects.filter(user=self.other_user.pk).exists())
+
+
+class ExpensesAdminTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='adminpass123'
+        )
+        self.client.force_login(self.admin)
+        self.categories = [Category.objects.create(name=f'Category {i}') for i in range(5)]
+
+    def create_expenses(self, count):
+        for i in range(count):
+            user = User.objects.create_user(username=f'user{User.objects.count()}')
+            Expenses.objects.create(
+                user=user,
+                category=self.categories[i % len(self.categories)],
+                amount=Decimal('10.00'),
+                description='Expense',
+                date=date.today() - timedelta(days=i)
+            )
+
+    def changelist_queries(self):
+        url = reverse('admin:expenses_tracker_expenses_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_query_count_constant(self):
+        self.create_expenses(3)
+        small = self.changelist_queries()
+        self.create_expenses(20)
+        self.assertEqual(self.changelist_queries(), small)
+
+    def test_user_changelist_loads(self):
+        response = self.client.get(reverse('admin:auth_user_changelist'))
+        self.assertEqual(response.status_code, 200)
+
+
+class PurgeTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.other_user = User.objects.create_user(
+            username='otheruser',
+            email='other@example.com',
+            password='testpass123'
+        )
+        self.staff = User.objects.create_user(
+            username='staff',
+            email='staff@example.com',
+            password='testpass123',
+            is_staff=True
+        )
+        self.food = Category.objects.create(name='Food')
+        self.transport = Category.objects.create(name='Transport')
+        for user in (self.user, self.other_user):
+            for category in (self.food, self.transport):
+                for _ in range(3):
+                    Expenses.objects.create(
+                        user=user,
+                        category=category,
+                        amount=Decimal('10.00'),
+                        description='Expense',
+                        date=date.today()
+                    )
+
+    def authenticate(self, user):
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_account_delete_deactivates_then_purges(self):
+        self.authenticate(self.user)
+        response = self.client.delete(reverse('account-delete'))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+
+        job = run_purge_job(response.data['id'], batch_size=4)
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(job.total, 6)
+        self.assertEqual(PurgeJob.objects.get(pk=job.pk).deleted_count, 6)
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertEqual(Expenses.objects.filter(user=self.other_user).count(), 6)
+
+    def test_category_delete_requires_staff(self):
+        self.authenticate(self.user)
+        response = self.client.delete(reverse('category-detail', args=[self.food.id]))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_category_purge_records_tombstones(self):
+        self.authenticate(self.staff)
+        response = self.client.delete(reverse('category-detail', args=[self.food.id]))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertIsNone(category_cache.get(self.food.id))
+
+        run_purge_job(response.data['id'], batch_size=4)
+        self.assertFalse(Category.objects.filter(pk=self.food.pk).exists())
+        self.assertEqual(Expenses.objects.count(), 6)
+        tombstones = ExpenseChange.objects.filter(deleted=True)
+        self.assertEqual(tombstones.filter(user=self.user).count(), 3)
+        self.assertEqual(tombstones.filter(user=self.other_user).count(), 3)
+
+        progress = self.client.get(reverse('purge-job-detail', args=[response.data['id']]))
+        self.assertEqual(progress.data['status'], 'completed')
+        self.assertEqual(progress.data['deleted_count'], 6)
+
+    def test_resumes_after_interruption(self):
+        job = start_purge('category', self.transport)
+        purge_expense_batch(job, 4)
+        PurgeJob.objects.filter(pk=job.pk).update(status='running')
+
+        # A worker that reported progress recently still holds the job
+        call_command('resume_purge_jobs', '--batch-size', '4', stdout=io.StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'running')
+        self.assertEqual(job.deleted_count, 4)
+
+        PurgeJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        call_command('resume_purge_jobs', '--batch-size', '4', stdout=io.StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(job.deleted_count, 6)
+        self.assertFalse(Expenses.objects.filter(category=self.transport.pk).exists())
+
+    def test_admin_delete_view_queues_purge(self):
+        admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='adminpass123')
+        self.client.force_login(admin)
+        url = reverse('admin:expenses_tracker_category_delete', args=[self.food.id])
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        with mock.patch('expenses_tracker.purge._executor') as executor, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(executor.submit.called)
+        self.assertFalse(Category.objects.get(pk=self.food.pk).is_active)
+        self.assertEqual(Expenses.objects.filter(category=self.food).count(), 6)
+
+        response = self.client.post(reverse('admin:auth_user_delete', args=[self.user.id]))
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(User.objects.get(pk=self.user.pk).is_active)
+        self.assertTrue(PurgeJob.objects.filter(target='user', object_id=self.user.pk).exists())
+
+
+class ExpenseBulkAPITest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.other_user = User.objects.create_user(
+            username='otheruser',
+            email='other@example.com',
+            password='testpass123'
+        )
+        self.food = Category.objects.create(name='Food')
+        self.transport = Category.objects.create(name='Transport')
+        self.expenses = [
+            Expenses.objects.create(
+                user=self.user,
+                category=self.food,
+                amount=Decimal('10.00'),
+                description='Expense',
+                date=date(2025, 3, day)
+            )
+            for day in range(1, 6)
+        ]
+        self.other_expense = Expenses.objects.create(
+            user=self.other_user,
+            category=self.food,
+            amount=Decimal('10.00'),
+            description='Other user expense',
+            date=date(2025, 3, 1)
+        )
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_bulk_update_by_ids(self):
+        ids = [self.expenses[0].id, self.expenses[1].id, self.other_expense.id]
+        data = {'ids': ids, 'changes': {'category': self.transport.id}}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(reverse('expense-bulk'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE "expenses_tracker_expenses"')]), 1)
+        self.assertEqual(Expenses.objects.filter(category=self.transport).count(), 2)
+        self.other_expense.refresh_from_db()
+        self.assertEqual(self.other_expense.category, self.food)
+        self.assertEqual(ExpenseChange.objects.filter(user=self.user, expense_id__in=ids[:2]).count(), 4)
+
+    def test_bulk_delete_by_filter(self):
+        data = {'filter': {'category': 'food', 'date_from': '2025-03-03'}}
+        response = self.client.delete(reverse('expense-bulk'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['deleted'], 3)
+        self.assertEqual(Expenses.objects.filter(user=self.user).count(), 2)
+        self.assertTrue(Expenses.objects.filter(pk=self.other_expense.pk).exists())
+        self.assertEqual(ExpenseChange.objects.filter(user=self.user, deleted=True).count(), 3)
+
+    def test_bulk_delete_rejects_malformed_date(self):
+        count = Expenses.objects.count()
+        response = self.client.delete(reverse('expense-bulk'), {'filter': {'date_from': '2025-13-01'}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Expenses.objects.count(), count)
+
+    def test_bulk_delete_is_one_statement_without_signals(self):
+        # Pins the reliance on QuerySet._raw_delete in ExpenseBulkView
+        handler = mock.Mock()
+        post_delete.connect(handler, sender=Expenses)
+        self.addCleanup(post_delete.disconnect, handler, sender=Expenses)
+        data = {'ids': [expense.id for expense in self.expenses]}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(reverse('expense-bulk'), data, format='json')
+        self.assertEqual(response.data['deleted'], len(self.expenses))
+        deletes = [q['sql'] for q in queries if q['sql'].startswith('DELETE FROM "expenses_tracker_expenses"')]
+        self.assertEqual(len(deletes), 1)
+        handler.assert_not_called()
+
+    def test_bulk_requires_ids_or_filter(self):
+        response = self.client.delete(reverse('expense-bulk'), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_update_validates_changes(self):
+        data = {'ids': [self.expenses[0].id], 'changes': {'amount': '-5.00'}}
+        response = self.client.patch(reverse('expense-bulk'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecurringExpenseTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.category = Category.objects.create(name='Housing')
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def create_template(self, **kwargs):
+        data = {
+            'user': self.user,
+            'category': self.category,
+            'amount': Decimal('500.00'),
+            'description': 'Rent',
+            'frequency': 'monthly',
+            'start_date': date(2025, 1, 31),
+            'next_date': date(2025, 1, 31),
+        }
+        data.update(kwargs)
+        return RecurringExpense.objects.create(**data)
+
+    def test_create_via_api(self):
+        data = {
+            'category': self.category.id,
+            'amount': '15.99',
+            'description': 'Streaming',
+            'frequency': 'monthly',
+            'start_date': '2025-02-10'
+        }
+        response = self.client.post(reverse('recurring-expense-list-create'), data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['next_date'], '2025-02-10')
+        self.assertEqual(response.data['category_name'], 'Housing')
+
+    def test_materializes_due_occurrences_with_month_end_clamp(self):
+        template = self.create_template()
+        created = materialize_recurring_expenses(date(2025, 4, 15))
+        self.assertEqual(created, 3)
+        dates = list(Expenses.objects.filter(recurring=template).order_by('date').values_list('date', flat=True))
+        self.assertEqual(dates, [date(2025, 1, 31), date(2025, 2, 28), date(2025, 3, 31)])
+        template.refresh_from_db()
+        self.assertEqual(template.next_date, date(2025, 4, 30))
+        self.assertEqual(ExpenseChange.objects.filter(user=self.user).count(), 3)
+
+    def test_rerun_is_idempotent(self):
+        template = self.create_template()
+        materialize_recurring_expenses(date(2025, 2, 28))
+        RecurringExpense.objects.filter(pk=template.pk).update(next_date=date(2025, 1, 31))
+        materialize_recurring_expenses(date(2025, 2, 28))
+        self.assertEqual(Expenses.objects.filter(recurring=template).count(), 2)
+        self.assertEqual(ExpenseChange.objects.filter(user=self.user).count(), 2)
+
+    def test_schedule_change_resets_next_date(self):
+        template = self.create_template()
+        materialize_recurring_expenses(date(2025, 2, 28))
+        url = reverse('recurring-expense-detail', args=[template.id])
+        response = self.client.patch(url, {'frequency': 'weekly', 'start_date': '2025-02-03'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['next_date'], '2025-03-03')
+
+        response = self.client.patch(url, {'amount': '450.00'})
+        self.assertEqual(response.data['next_date'], '2025-03-03')
+
+    def test_extending_end_date_reactivates(self):
+        template = self.create_template(end_date=date(2025, 2, 28))
+        materialize_recurring_expenses(date(2025, 4, 15))
+        template.refresh_from_db()
+        self.assertFalse(template.is_active)
+
+        url = reverse('recurring-expense-detail', args=[template.id])
+        response = self.client.patch(url, {'end_date': '2025-12-31'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['is_active'])
+        self.assertEqual(materialize_recurring_expenses(date(2025, 4, 15)), 1)
+
+    def test_batches_and_end_date(self):
+        ended = self.create_template(frequency='weekly', start_date=date(2025, 3, 1), next_date=date(2025, 3, 1), end_date=date(2025, 3, 10))
+        for _ in range(4):
+            self.create_template(frequency='yearly', start_date=date(2025, 3, 1), next_date=date(2025, 3, 1))
+        created = materialize_recurring_expenses(date(2025, 3, 31), batch_size=2)
+        self.assertEqual(created, 6)
+        ended.refresh_from_db()
+        self.assertFalse(ended.is_active)
+        self.assertEqual(RecurringExpense.objects.filter(next_date=date(2026, 3, 1)).count(), 4)
+
+
+class BudgetAPITest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.food = Category.objects.create(name='Food')
+        self.transport = Category.objects.create(name='Transport')
+        self.today = timezone.localdate()
+        self.create_expense(self.food, '30.00')
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def create_expense(self, category, amount, day=None):
+        return Expenses.objects.create(
+            user=self.user,
+            category=category,
+            amount=Decimal(amount),
+            description='Expense',
+            date=day or self.today
+        )
+
+    def create_budget(self, category, amount='100.00', threshold=80):
+        response = self.client.post(reverse('budget-list-create'), {
+            'category': category.id,
+            'amount': amount,
+            'threshold': threshold
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Budget.objects.get(pk=response.data['id'])
+
+    def test_create_counts_current_month(self):
+        self.create_expense(self.food, '500.00', day=self.today.replace(day=1) - timedelta(days=1))
+        budget = self.create_budget(self.food)
+        self.assertEqual(budget.spent, Decimal('30.00'))
+
+    def test_spend_tracked_incrementally(self):
+        budget = self.create_budget(self.food)
+        expense = self.create_expense(self.food, '20.00')
+        expense.amount = Decimal('25.00')
+        expense.save()
+        self.create_expense(self.transport, '99.00')
+        budget.refresh_from_db()
+        self.assertEqual(budget.spent, Decimal('55.00'))
+
+        expense.delete()
+        budget.refresh_from_db()
+        self.assertEqual(budget.spent, Decimal('30.00'))
+
+    def test_expense_api_update_moves_spend(self):
+        food_budget = self.create_budget(self.food)
+        transport_budget = self.create_budget(self.transport)
+        expense = Expenses.objects.get(category=self.food)
+        response = self.client.patch(reverse('expense-detail', args=[expense.id]), {'category': self.transport.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        food_budget.refresh_from_db()
+        transport_budget.refresh_from_db()
+        self.assertEqual(food_budget.spent, Decimal('0.00'))
+        self.assertEqual(transport_budget.spent, Decimal('30.00'))
+
+    def test_threshold_crossing_flagged_at_write(self):
+        budget = self.create_budget(self.food)
+        self.assertIsNone(budget.threshold_crossed_at)
+        expense = self.create_expense(self.food, '55.00')
+        budget.refresh_from_db()
+        self.assertIsNotNone(budget.threshold_crossed_at)
+
+        expense.delete()
+        budget.refresh_from_db()
+        self.assertIsNone(budget.threshold_crossed_at)
+
+    def test_deferred_save_keeps_crossing_time(self):
+        budget = self.create_budget(self.food)
+        expense = self.create_expense(self.food, '55.00')
+        budget.refresh_from_db()
+        crossed_at = budget.threshold_crossed_at
+
+        deferred = Expenses.objects.only('id', 'description').get(pk=expense.pk)
+        deferred.description = 'Groceries'
+        deferred.save()
+        budget.refresh_from_db()
+        self.assertEqual(budget.threshold_crossed_at, crossed_at)
+        self.assertEqual(budget.spent, Decimal('85.00'))
+
+    def test_bulk_operations_keep_totals(self):
+        budget = self.create_budget(self.food)
+        transport_budget = self.create_budget(self.transport)
+        ids = [self.create_expense(self.food, '10.00').id for _ in range(3)]
+        self.client.patch(reverse('expense-bulk'), {'ids': ids[:2], 'changes': {'category': self.transport.id}}, format='json')
+        self.client.delete(reverse('expense-bulk'), {'ids': ids[2:]}, format='json')
+        budget.refresh_from_db()
+        transport_budget.refresh_from_db()
+        self.assertEqual(budget.spent, Decimal('30.00'))
+        self.assertEqual(transport_budget.spent, Decimal('20.00'))
+
+    def test_status_endpoint(self):
+        self.create_budget(self.food, amount='35.00')
+        Budget.objects.update(period_start=date(2000, 1, 1), spent=Decimal('999.00'))
+        response = self.client.get(reverse('budget-list-create'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['spent'], '30.00')
+        self.assertEqual(response.data[0]['remaining'], '5.00')
+        self.assertTrue(response.data[0]['threshold_crossed'])
+        self.assertFalse(response.data[0]['over_budget'])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('budget-list-create'))
+        self.assertFalse([q for q in queries if 'expenses_tracker_expenses' in q['sql']])
+
+    def test_recurring_materialization_counted_once(self):
+        budget = self.create_budget(self.food)
+        template = RecurringExpense.objects.create(
+            user=self.user,
+            category=self.food,
+            amount=Decimal('12.00'),
+            description='Subscription',
+            frequency='monthly',
+            start_date=self.today,
+            next_date=self.today
+        )
+        materialize_recurring_expenses(self.today)
+        RecurringExpense.objects.filter(pk=template.pk).update(next_date=self.today)
+        materialize_recurring_expenses(self.today)
+        budget.refresh_from_db()
+        self.assertEqual(budget.spent, Decimal('42.00'))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class RequestProfilerTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.staff = User.objects.create_user(
+            username='staff',
+            email='staff@example.com',
+            password='testpass123',
+            is_staff=True
+        )
+        category = Category.objects.create(name='Food')
+        Expenses.objects.create(
+            user=self.user,
+            category=category,
+            amount=Decimal('15.00'),
+            description='Coffee',
+            date=date.today()
+        )
+
+    def authenticate(self, user):
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_not_profiled_by_default(self):
+        self.authenticate(self.user)
+        response = self.client.get(reverse('expense-summary'))
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_signed_header_profiles_request(self):
+        self.authenticate(self.user)
+        response = self.client.get(reverse('expense-summary'), HTTP_X_PROFILE=make_profile_token())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual(profile.user, self.user)
+        artifact = json.loads(profile.file.read())
+        self.assertEqual(artifact['query_count'], len(artifact['queries']))
+        self.assertTrue(any('SUM' in query['sql'] for query in artifact['queries']))
+        self.assertIn('cumulative', artifact['profile'])
+
+    def test_invalid_header_ignored(self):
+        self.authenticate(self.user)
+        response = self.client.get(reverse('expense-summary'), HTTP_X_PROFILE='forged')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('X-Profile-Id', response)
+
+    def test_query_flag_staff_only(self):
+        self.authenticate(self.user)
+        response = self.client.get(reverse('expense-list-create'), {'profile': '1'})
+        self.assertNotIn('X-Profile-Id', response)
+
+        self.authenticate(self.staff)
+        response = self.client.get(reverse('expense-list-create'), {'profile': '1'})
+        self.assertIn('X-Profile-Id', response)
+
+        download = self.client.get(reverse('profile-download', args=[response['X-Profile-Id']]))
+        self.assertEqual(download.status_code, status.HTTP_200_OK)
+        artifact = json.loads(b''.join(download.streaming_content))
+        self.assertEqual(artifact['path'], '/api/expenses/?profile=1')
+
+    def test_falsy_query_flag_ignored(self):
+        self.authenticate(self.staff)
+        response = self.client.get(reverse('expense-list-create'), {'profile': '0'})
+        self.assertNotIn('X-Profile-Id', response)
+
+    def test_storage_failure_keeps_response(self):
+        self.authenticate(self.user)
+        with mock.patch('django.core.files.storage.FileSystemStorage.save', side_effect=OSError('disk full')):
+            with self.assertLogs('expenses_tracker.profiling', level='ERROR'):
+                response = self.client.get(reverse('expense-summary'), HTTP_X_PROFILE=make_profile_token())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_auth_params_not_stored(self):
+        response = self.client.post(
+            reverse('login'), {'email': 'test@example.com', 'password': 'testpass123'}, HTTP_X_PROFILE=make_profile_token()
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        artifact = json.loads(RequestProfile.objects.get(pk=response['X-Profile-Id']).file.read())
+        self.assertTrue(artifact['queries'])
+        self.assertTrue(all(query['params'] is None for query in artifact['queries']))
+
+    def test_prune_removes_old_profiles_and_files(self):
+        self.authenticate(self.user)
+        response = self.client.get(reverse('expense-summary'), HTTP_X_PROFILE=make_profile_token())
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        storage, name = profile.file.storage, profile.file.name
+        RequestProfile.objects.update(created_at=timezone.now() - timedelta(days=30))
+
+        call_command('prune_request_profiles', stdout=io.StringIO())
+        self.assertFalse(RequestProfile.objects.exists())
+        self.assertFalse(storage.exists(name))
@@ -5,12 +5,34 @@ urlpatterns = [
     # regitration
     path('auth/register/', views.RegistrationView.as_view(), name='register'),
     path('auth/login/', views.LoginView.as_view(), name='login'),
+    path('auth/account/', views.AccountDeleteView.as_view(), name='account-delete'),
 
      # Expenses
     path('expenses/', views.ExpenseListCreateView.as_view(), name='expense-list-create'),
     path('expenses/<int:pk>/', views.ExpenseDetailView.as_view(), name='expense-detail'),
     path('expenses/summary/', views.ExpenseSummaryView.as_view(), name='expense-summary'),
+    path('expenses/stats/', views.ExpenseStatsView.as_view(), name='expense-stats'),
+    path('expenses/changes/', views.ExpenseChangesView.as_view(), name='expense-changes'),
+    path('expenses/bulk/', views.ExpenseBulkView.as_view(), name='expense-bulk'),
     
+    # Recurring expenses
+    path('recurring-expenses/', views.RecurringExpenseListCreateView.as_view(), name='recurring-expense-list-create'),
+    path('recurring-expenses/<int:pk>/', views.RecurringExpenseDetailView.as_view(), name='recurring-expense-detail'),
+
+    # Budgets
+    path('budgets/', views.BudgetListCreateView.as_view(), name='budget-list-create'),
+    path('budgets/<int:pk>/', views.BudgetDetailView.as_view(), name='budget-detail'),
+
     # Categories
     path('categories/', views.CategoryListView.as_view(), name='category-list'),
+    path('categories/<int:pk>/', views.CategoryDetailView.as_view(), name='category-detail'),
+    path('purge-jobs/<int:pk>/', views.PurgeJobDetailView.as_view(), name='purge-job-detail'),
+
+    # Reports
+    path('reports/', views.ReportJobCreateView.as_view(), name='report-list-create'),
+    path('reports/<int:pk>/', views.ReportJobDetailView.as_view(), name='report-detail'),
+    path('reports/<int:pk>/download/', views.ReportDownloadView.as_view(), name='report-download'),
+
+    # Profiling
+    path('profiles/<int:pk>/download/', views.RequestProfileDownloadView.as_view(), name='profile-download'),
 ]
\ No newline at end of file
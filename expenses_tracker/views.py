@@ -5,9 +5,19 @@ from django.contrib.auth.models import User
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.views import APIView
+from rest_framework.exceptions import ValidationError
 from django.contrib.auth import authenticate
 from . models import *
 from django.db.models import Sum, Count, Min, Max
+from django.http import FileResponse
+from django.db import transaction
+from django.utils import timezone
+from .budgets import apply_spend_deltas, grouped_spend, merge_deltas, refresh_budget, roll_over_budgets
+from .category_cache import category_cache
+from .purge import start_purge
+from .sync import SyncTokenExpired, changes_since, current_token, record_changes
+from .stats import compute_spending_stats
+from .reports import summarize_expenses, period_range, expenses_for_job, fingerprint_expenses, find_cached_report, enqueue_report
 from datetime import datetime
 
 # Create your views here.
@@ -90,7 +100,51 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     def get_object(self):
         return self.request.user
 
-class ExpenseListCreateView(generics.ListCreateAPIView):
+class ExpenseFieldsMixin:
+    # Sparse fieldsets: ?fields=id,amount,date limits both the serialized
+    # output and the columns selected for GET requests
+    def get_requested_fields(self):
+        if self.request.method != 'GET':
+            return None
+
+        fields = self.request.query_params.get('fields')
+        if not fields:
+            return None
+
+        requested = [name.strip() for name in fields.split(',') if name.strip()]
+        unknown = [name for name in requested if name not in ExpenseSerializer.field_columns]
+        if unknown:
+            raise ValidationError({'fields': f"Unknown fields: {', '.join(unknown)}"})
+        return requested
+
+    def get_expense_queryset(self):
+        queryset = Expenses.objects.filter(user=self.request.user)
+        fields = self.get_requested_fields()
+
+        # category_name comes from the category cache, so no join is needed
+        if fields is None:
+            return queryset
+
+        columns = ['id']
+        for name in fields:
+            columns.extend(ExpenseSerializer.field_columns[name])
+        return queryset.only(*columns)
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields is not None and self.get_serializer_class() is ExpenseSerializer:
+            kwargs['fields'] = fields
+        return super().get_serializer(*args, **kwargs)
+
+class AccountDeleteView(APIView):
+    # Deactivate the current user now and purge their data in the background
+    permission_classes = [permissions.IsAuthenticated]
+
+    def delete(self, request):
+        job = start_purge('user', request.user)
+        return Response(PurgeJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+class ExpenseListCreateView(ExpenseFieldsMixin, generics.ListCreateAPIView):
     #List user expenses and create new expenses
     permission_classes = [permissions.IsAuthenticated]
     
@@ -100,40 +154,154 @@ class ExpenseListCreateView(generics.ListCreateAPIView):
         return ExpenseSerializer
     
     def get_queryset(self):
-        queryset = Expenses.objects.filter(user=self.request.user).select_related('category')
-        
-        # Optional filtering
-        category = self.request.query_params.get('category')
-        date_from = self.request.query_params.get('date_from')
-        date_to = self.request.query_params.get('date_to')
-        
-        if category:
-            queryset = queryset.filter(category__name__icontains=category)
-        if date_from:
-            try:
-                date_from = datetime.strptime(date_from, '%Y-%m-%d').date()
-                queryset = queryset.filter(date__gte=date_from)
-            except ValueError:
-                pass
-        if date_to:
-            try:
-                date_to = datetime.strptime(date_to, '%Y-%m-%d').date()
-                queryset = queryset.filter(date__lte=date_to)
-            except ValueError:
-                pass
-        
-        return queryset
+        return filter_expenses(self.get_expense_queryset(), self.request.query_params)
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class ExpenseDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ExpenseDetailView(ExpenseFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
     # Retrieve, update, or delete a specific expense
     serializer_class = ExpenseSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Expenses.objects.filter(user=self.request.user).select_related('category')
+        queryset = self.get_expense_queryset()
+        if self.request.method in ('PUT', 'PATCH', 'DELETE'):
+            # Concurrent writes to one expense would each apply a budget delta
+            # against the same loaded amount; the row lock serializes them
+            queryset = queryset.select_for_update()
+        return queryset
+
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            return super().update(request, *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        with transaction.atomic():
+            return super().destroy(request, *args, **kwargs)
+
+class ExpenseChangesView(APIView):
+    # Delta sync: expenses changed and deleted since a change token
+    permission_classes = [permissions.IsAuthenticated]
+    default_limit = 500
+    max_limit = 1000
+    
+    def get(self, request):
+        since = request.query_params.get('since')
+        
+        # Without a token, hand out the current one; the client then downloads
+        # the full list once and syncs from this point on
+        if not since:
+            return Response(ExpenseChangesSerializer({
+                'changed': [],
+                'deleted': [],
+                'next_token': str(current_token()),
+                'has_more': False
+            }).data)
+        
+        try:
+            since = int(since)
+            limit = min(int(request.query_params.get('limit', self.default_limit)), self.max_limit)
+        except ValueError:
+            return Response({
+                'error': 'Invalid since or limit'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if since < 0 or limit < 1:
+            return Response({
+                'error': 'Invalid since or limit'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            changed, deleted, next_token, has_more = changes_since(request.user, since, limit)
+        except SyncTokenExpired:
+            return Response({
+                'error': 'Sync token expired, a full resync is required'
+            }, status=status.HTTP_410_GONE)
+        
+        serializer = ExpenseChangesSerializer({
+            'changed': changed,
+            'deleted': deleted,
+            'next_token': str(next_token),
+            'has_more': has_more
+        })
+        return Response(serializer.data)
+
+def filter_by_date_range(expenses, params):
+    # Optional date_from / date_to filtering; malformed dates are ignored
+    date_from = params.get('date_from')
+    date_to = params.get('date_to')
+    
+    if date_from:
+        try:
+            date_from = datetime.strptime(date_from, '%Y-%m-%d').date()
+            expenses = expenses.filter(date__gte=date_from)
+        except ValueError:
+            pass
+    if date_to:
+        try:
+            date_to = datetime.strptime(date_to, '%Y-%m-%d').date()
+            expenses = expenses.filter(date__lte=date_to)
+        except ValueError:
+            pass
+    
+    return expenses
+
+def filter_expenses(expenses, params):
+    # The expense list filters: category name, date_from and date_to
+    category = params.get('category')
+    if category:
+        expenses = expenses.filter(category__in=category_cache.ids_matching(category))
+    return filter_by_date_range(expenses, params)
+
+class ExpenseBulkView(APIView):
+    # Update or delete many of the user's expenses with a single statement
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_locked_ids(self, data):
+        expenses = Expenses.objects.filter(user=self.request.user)
+        if 'ids' in data:
+            expenses = expenses.filter(id__in=data['ids'])
+        else:
+            expenses = filter_expenses(expenses, data['filter'])
+        
+        ids = list(expenses.order_by().select_for_update().values_list('id', flat=True)[:BULK_LIMIT + 1])
+        if len(ids) > BULK_LIMIT:
+            raise ValidationError({'error': f'More than {BULK_LIMIT} expenses match; narrow the filter'})
+        return ids
+    
+    def patch(self, request):
+        serializer = ExpenseBulkUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changes = serializer.validated_data['changes']
+        
+        with transaction.atomic():
+            ids = self.get_locked_ids(serializer.validated_data)
+            expenses = Expenses.objects.filter(user=request.user, id__in=ids)
+            before = grouped_spend(expenses, sign=-1)
+            updated = expenses.update(updated_at=timezone.now(), **changes)
+            apply_spend_deltas(request.user.id, merge_deltas(before, grouped_spend(expenses)))
+            record_changes(request.user.id, ids)
+        
+        return Response({'updated': updated}, status=status.HTTP_200_OK)
+    
+    def delete(self, request):
+        serializer = ExpenseBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        with transaction.atomic():
+            ids = self.get_locked_ids(serializer.validated_data)
+            expenses = Expenses.objects.filter(user=request.user, id__in=ids)
+            before = grouped_spend(expenses, sign=-1)
+            # Deliberate use of Django's private QuerySet._raw_delete: it issues
+            # one DELETE without loading rows or sending signals, which .delete()
+            # cannot do. Safe while no model has a foreign key to Expenses, and
+            # the budget and sync updates the signals would make are applied
+            # below. ExpenseBulkAPITest pins this behaviour across upgrades
+            deleted = expenses._raw_delete(using=expenses.db)
+            apply_spend_deltas(request.user.id, before)
+            record_changes(request.user.id, ids, deleted=True)
+        
+        return Response({'deleted': deleted}, status=status.HTTP_200_OK)
 
 class ExpenseSummaryView(APIView):
     # Get expense summary for the current user
@@ -141,68 +309,179 @@ class ExpenseSummaryView(APIView):
     
     def get(self, request):
         user = request.user
-        expenses = Expenses.objects.filter(user=user)
-        
-        # Optional date filtering
-        date_from = request.query_params.get('date_from')
-        date_to = request.query_params.get('date_to')
-        
-        if date_from:
-            try:
-                date_from = datetime.strptime(date_from, '%Y-%m-%d').date()
-                expenses = expenses.filter(date__gte=date_from)
-            except ValueError:
-                pass
-        if date_to:
-            try:
-                date_to = datetime.strptime(date_to, '%Y-%m-%d').date()
-                expenses = expenses.filter(date__lte=date_to)
-            except ValueError:
-                pass
-        
-        # Calculate total spent
-        total_spent = expenses.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        
-        # Calculate spending by category
-        category_summary = expenses.values('category__name').annotate(
-            total=Sum('amount'),
-            count=Count('id')
-        ).order_by('-total')
-        
-        categories = {
-            item['category__name']: {
-                'total': item['total'],
-                'count': item['count']
-            }
-            for item in category_summary
-        }
-        
-        # Get date range
-        date_range_data = expenses.aggregate(
-            earliest=Min('date'),
-            latest=Max('date')
-        )
-        
-        date_range = {}
-        if date_range_data['earliest'] and date_range_data['latest']:
-            date_range = {
-                'earliest': date_range_data['earliest'].isoformat(),
-                'latest': date_range_data['latest'].isoformat()
-            }
+        expenses = filter_by_date_range(Expenses.objects.filter(user=user), request.query_params)
         
-        summary_data = {
-            'total_spent': total_spent,
-            'categories': categories,
-            'expense_count': expenses.count(),
-            'date_range': date_range
-        }
+        summary_data = summarize_expenses(expenses)
         
         serializer = ExpenseSummarySerializer(summary_data)
         return Response(serializer.data)
 
+class ExpenseStatsView(APIView):
+    # Per-category spending statistics and outliers for the current user
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        expenses = filter_by_date_range(Expenses.objects.filter(user=request.user), request.query_params)
+        
+        serializer = ExpenseStatsSerializer(compute_spending_stats(expenses))
+        return Response(serializer.data)
+
+class RecurringExpenseListCreateView(generics.ListCreateAPIView):
+    # List and create the user's recurring expenses
+    serializer_class = RecurringExpenseSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return RecurringExpense.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+class RecurringExpenseDetailView(generics.RetrieveUpdateDestroyAPIView):
+    # Retrieve, update, or delete a recurring expense; past occurrences are kept
+    serializer_class = RecurringExpenseSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return RecurringExpense.objects.filter(user=self.request.user)
+
+class BudgetListCreateView(generics.ListCreateAPIView):
+    # Budget status for every category the user budgets, and budget creation
+    serializer_class = BudgetSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None
+
+    def get_queryset(self):
+        return Budget.objects.filter(user=self.request.user).order_by('category_id')
+
+    def list(self, request, *args, **kwargs):
+        roll_over_budgets(request.user)
+        return super().list(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        budget = serializer.save(user=self.request.user, period_start=timezone.localdate().replace(day=1))
+        serializer.instance = refresh_budget(budget)
+
+class BudgetDetailView(generics.RetrieveUpdateDestroyAPIView):
+    # Retrieve, update, or delete a budget
+    serializer_class = BudgetSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Budget.objects.filter(user=self.request.user)
+
+    def perform_update(self, serializer):
+        # A new category or limit needs the spend and threshold recomputed; a
+        # new category also starts without a recorded crossing
+        old_category_id = serializer.instance.category_id
+        budget = serializer.save()
+        serializer.instance = refresh_budget(budget, reset_threshold=budget.category_id != old_category_id)
+
 class CategoryListView(generics.ListCreateAPIView):
     # List and create categories
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request, *args, **kwargs):
+        # Served from the category cache; paginating a list needs no COUNT query
+        rows = category_cache.all()
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer(rows, many=True)
+        return Response(serializer.data)
         
+
+
+class ReportJobCreateView(generics.ListCreateAPIView):
+    # Submit a report job, or list the user's report jobs
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_serializer_class(self):
+        if self.request.method == 'POST':
+            return ReportRequestSerializer
+        return ReportJobSerializer
+
+    def get_queryset(self):
+        return ReportJob.objects.filter(user=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        date_from, date_to = period_range(data['period'], data['year'], data.get('month'))
+        job = ReportJob(
+            user=request.user,
+            period=data['period'],
+            format=data['format'],
+            date_from=date_from,
+            date_to=date_to
+        )
+        job.fingerprint = fingerprint_expenses(expenses_for_job(job))
+
+        # Same user, range and unchanged data: hand back the earlier result
+        cached = find_cached_report(job)
+        if cached:
+            code = status.HTTP_200_OK if cached.status == 'completed' else status.HTTP_202_ACCEPTED
+            return Response(ReportJobSerializer(cached, context=self.get_serializer_context()).data, status=code)
+
+        job.save()
+        enqueue_report(job)
+        return Response(ReportJobSerializer(job, context=self.get_serializer_context()).data, status=status.HTTP_202_ACCEPTED)
+
+class ReportJobDetailView(generics.RetrieveAPIView):
+    # Poll the status of a report job
+    serializer_class = ReportJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return ReportJob.objects.filter(user=self.request.user)
+
+class ReportDownloadView(generics.GenericAPIView):
+    # Download a completed report
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return ReportJob.objects.filter(user=self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        job = self.get_object()
+        if job.status != 'completed' or not job.file:
+            return Response({
+                'error': 'Report is not ready'
+            }, status=status.HTTP_409_CONFLICT)
+
+        return FileResponse(job.file.open('rb'), as_attachment=True, filename=job.file.name.split('/')[-1])
+
+class CategoryDetailView(generics.RetrieveDestroyAPIView):
+    # Retrieve a category; staff can delete it together with its expenses
+    queryset = Category.objects.filter(is_active=True)
+    serializer_class = CategorySerializer
+
+    def get_permissions(self):
+        if self.request.method == 'DELETE':
+            return [permissions.IsAdminUser()]
+        return [permissions.IsAuthenticated()]
+
+    def destroy(self, request, *args, **kwargs):
+        job = start_purge('category', self.get_object())
+        return Response(PurgeJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+class PurgeJobDetailView(generics.RetrieveAPIView):
+    # Progress of a background user or category purge
+    queryset = PurgeJob.objects.all()
+    serializer_class = PurgeJobSerializer
+    permission_classes = [permissions.IsAdminUser]
+
+class RequestProfileDownloadView(generics.GenericAPIView):
+    # Download the artifact of a profiled request
+    queryset = RequestProfile.objects.all()
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        profile = self.get_object()
+        return FileResponse(profile.file.open('rb'), as_attachment=True, filename=f'profile_{profile.pk}.json')
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     'corsheaders',
     'rest_framework',
     'rest_framework_simplejwt',
+    'django_crontab',
 ]
 
 MIDDLEWARE = [
@@ -54,6 +55,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'expenses_tracker.profiling.RequestProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'project.urls'
@@ -143,6 +145,63 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Cache
+# Redis is shared by all workers; without it the database cache table keeps
+# the category version shared too (python manage.py createcachetable)
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'expenses_tracker_cache',
+        }
+    }
+
+# Seconds a worker serves categories from its local copy before checking the
+# shared version again; changes made by the same worker apply immediately
+CATEGORY_CACHE_CHECK_SECONDS = float(os.getenv('CATEGORY_CACHE_CHECK_SECONDS', '1'))
+
+# Background report generation
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', '2'))
+# Seconds after which an unfinished report job is treated as abandoned
+REPORT_STALE_SECONDS = int(os.getenv('REPORT_STALE_SECONDS', '600'))
+
+# Days of expense change history kept for mobile delta sync
+SYNC_LOG_RETENTION_DAYS = int(os.getenv('SYNC_LOG_RETENTION_DAYS', '30'))
+# Seconds a change must be old before sync tokens move past it; transactions
+# writing expenses must commit within this time
+SYNC_SAFETY_LAG_SECONDS = int(os.getenv('SYNC_SAFETY_LAG_SECONDS', '10'))
+
+# Rows removed per DELETE statement when purging a user or category
+PURGE_BATCH_SIZE = int(os.getenv('PURGE_BATCH_SIZE', '5000'))
+# Seconds without progress after which a running purge may be taken over
+PURGE_LEASE_SECONDS = int(os.getenv('PURGE_LEASE_SECONDS', '300'))
+
+# Recurring expense templates handled per transaction by the scheduler
+RECURRING_BATCH_SIZE = int(os.getenv('RECURRING_BATCH_SIZE', '1000'))
+
+# Scheduled jobs (python manage.py crontab add)
+CRONJOBS = [
+    ('0 1 * * *', 'django.core.management.call_command', ['materialize_recurring_expenses']),
+    ('30 2 * * *', 'django.core.management.call_command', ['prune_request_profiles']),
+    ('0 3 * * *', 'django.core.management.call_command', ['prune_sync_log']),
+    ('*/10 * * * *', 'django.core.management.call_command', ['resume_report_jobs']),
+]
+
+# Lifetime in seconds of X-Profile header tokens (python manage.py make_profile_token)
+PROFILING_TOKEN_MAX_AGE = int(os.getenv('PROFILING_TOKEN_MAX_AGE', '3600'))
+# Days request profiles and their files are kept (python manage.py prune_request_profiles)
+PROFILE_RETENTION_DAYS = int(os.getenv('PROFILE_RETENTION_DAYS', '7'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 